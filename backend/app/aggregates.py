@@ -0,0 +1,239 @@
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .derived import pm25_to_aqi_array
+from .locations import to_list
+
+# WHO 2021 24-hour guideline levels (µg/m³); an hour above them counts as an exceedance hour
+EXCEEDANCE_THRESHOLDS = {"pm2_5": 15.0, "pm10": 45.0}
+
+MEAN_HOURS = 24
+MEAN_MIN_HOURS = 18  # 75% completeness, as for regulatory daily means
+NOWCAST_HOURS = 12
+NOWCAST_MIN_WEIGHT = 0.5  # EPA NowCast floor for particulate matter
+
+
+def _nowcast_windows(windows: np.ndarray) -> np.ndarray:
+    """EPA NowCast for rows of hourly concentrations ordered most recent first (NaN = missing).
+    Needs at least two of the three most recent hours; weight w = max(min/max, 0.5) and
+    NowCast = sum(w**i * c_i) / sum(w**i) over the valid hours.
+    """
+    valid = ~np.isnan(windows)
+    with np.errstate(invalid="ignore", divide="ignore", all="ignore"):
+        cmax = np.max(np.where(valid, windows, -np.inf), axis=1)
+        cmin = np.min(np.where(valid, windows, np.inf), axis=1)
+        ratio = np.where(cmax > 0, cmin / cmax, 1.0)
+        w = np.maximum(ratio, NOWCAST_MIN_WEIGHT)
+        powers = w[:, None] ** np.arange(windows.shape[1])
+        weights = np.where(valid, powers, 0.0)
+        out = (weights * np.where(valid, windows, 0.0)).sum(axis=1) / weights.sum(axis=1)
+    enough = valid[:, :3].sum(axis=1) >= 2
+    return np.where(enough, out, np.nan)
+
+
+def nowcast(values: np.ndarray, hours: int = NOWCAST_HOURS) -> np.ndarray:
+    """NowCast at every hour of a contiguous hourly series."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values.copy()
+    padded = np.concatenate([np.full(hours - 1, np.nan), values])
+    return _nowcast_windows(sliding_window_view(padded, hours)[:, ::-1])
+
+
+def rolling_mean(values: np.ndarray, hours: int = MEAN_HOURS, min_hours: int = MEAN_MIN_HOURS) -> np.ndarray:
+    """Trailing mean over `hours` at every hour, NaN where fewer than min_hours are valid."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    lo = np.maximum(np.arange(1, values.size + 1) - hours, 0)
+    window_sum = sums[1:] - sums[lo]
+    window_count = counts[1:] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_count >= min_hours, window_sum / window_count, np.nan)
+
+
+def daily_summary(times: Sequence[str], values: np.ndarray, threshold: float) -> List[dict]:
+    """Per calendar day (first 10 characters of the ISO time): max, min, valid hours and exceedance hours."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return []
+    days = np.array([t[:10] for t in times])
+    starts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]]))
+    valid = ~np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        day_max = np.fmax.reduceat(values, starts)
+        day_min = np.fmin.reduceat(values, starts)
+        exceed = np.add.reduceat((values > threshold).astype(np.int64), starts)
+    hours = np.add.reduceat(valid.astype(np.int64), starts)
+    return [
+        _day_entry(days[s], day_max[i], day_min[i], int(hours[i]), int(exceed[i]))
+        for i, s in enumerate(starts)
+    ]
+
+
+def _day_entry(date: str, day_max: float, day_min: float, hours: int, exceedance_hours: int) -> dict:
+    return {
+        "date": str(date),
+        "max": None if np.isnan(day_max) or hours == 0 else round(float(day_max), 2),
+        "min": None if np.isnan(day_min) or hours == 0 else round(float(day_min), 2),
+        "hours": hours,
+        "exceedance_hours": exceedance_hours,
+    }
+
+
+def _value(v: float, digits: int = 2) -> Optional[float]:
+    return None if v is None or np.isnan(v) else round(float(v), digits)
+
+
+class RunningAggregates:
+    """Running 24-hour mean, NowCast, daily max/min and exceedance counts for one hourly series.
+
+    push() does constant work per hour: a running sum over the last 24 values, a
+    12-hour NowCast window and the open day's extremes. Gaps in time are filled
+    with missing hours so the windows stay aligned with the clock. Closed days are
+    kept for `keep_days`.
+    """
+
+    def __init__(self, threshold: float, keep_days: int = 31):
+        self.threshold = threshold
+        self.keep_days = keep_days
+        self.last_time: Optional[datetime] = None
+        self._mean_window: deque = deque(maxlen=MEAN_HOURS)
+        self._sum = 0.0
+        self._count = 0
+        self._recent: deque = deque(maxlen=NOWCAST_HOURS)
+        self._day: Optional[str] = None
+        self._day_max = np.nan
+        self._day_min = np.nan
+        self._day_hours = 0
+        self._day_exceed = 0
+        self.days: "OrderedDict[str, dict]" = OrderedDict()
+        self.exceedance_hours = 0
+        self.hours = 0
+
+    def push(self, time: datetime, value: Optional[float]) -> None:
+        if self.last_time is not None:
+            if time <= self.last_time:
+                return
+            gap = self.last_time + timedelta(hours=1)
+            while gap < time:
+                self._step(gap, np.nan)
+                gap += timedelta(hours=1)
+        self._step(time, np.nan if value is None else float(value))
+
+    def _step(self, time: datetime, value: float) -> None:
+        self.last_time = time
+        self.hours += 1
+        if len(self._mean_window) == MEAN_HOURS:
+            old = self._mean_window[0]
+            if not np.isnan(old):
+                self._sum -= old
+                self._count -= 1
+        self._mean_window.append(value)
+        self._recent.append(value)
+
+        day = time.strftime("%Y-%m-%d")
+        if day != self._day:
+            self._close_day()
+            self._day = day
+        if np.isnan(value):
+            return
+        self._sum += value
+        self._count += 1
+        self._day_max = np.fmax(self._day_max, value)
+        self._day_min = np.fmin(self._day_min, value)
+        self._day_hours += 1
+        if value > self.threshold:
+            self._day_exceed += 1
+            self.exceedance_hours += 1
+
+    def _close_day(self) -> None:
+        if self._day is not None:
+            self.days[self._day] = self._today()
+            while len(self.days) > self.keep_days:
+                self.days.popitem(last=False)
+        self._day_max = self._day_min = np.nan
+        self._day_hours = self._day_exceed = 0
+
+    def _today(self) -> dict:
+        return _day_entry(self._day, self._day_max, self._day_min, self._day_hours, self._day_exceed)
+
+    def mean_24h(self) -> float:
+        return self._sum / self._count if self._count >= MEAN_MIN_HOURS else np.nan
+
+    def nowcast(self) -> float:
+        if not self._recent:
+            return np.nan
+        window = np.full(NOWCAST_HOURS, np.nan)
+        window[:len(self._recent)] = list(reversed(self._recent))
+        return float(_nowcast_windows(window[None, :])[0])
+
+    def daily(self) -> List[dict]:
+        days = list(self.days.values())
+        if self._day is not None:
+            days.append(self._today())
+        return days
+
+    def snapshot(self) -> dict:
+        return {
+            "time": None if self.last_time is None else self.last_time.strftime("%Y-%m-%dT%H:%M"),
+            "mean_24h": _value(self.mean_24h()),
+            "nowcast": _value(self.nowcast()),
+            "today": None if self._day is None else self._today(),
+            "exceedance_hours": self.exceedance_hours,
+            "hours": self.hours,
+        }
+
+
+class AggregateTracker:
+    """RunningAggregates for each field of the ingested hourly series."""
+
+    def __init__(self, thresholds: Dict[str, float] = EXCEEDANCE_THRESHOLDS):
+        self.fields = {name: RunningAggregates(threshold) for name, threshold in thresholds.items()}
+
+    @property
+    def last_time(self) -> Optional[datetime]:
+        return next(iter(self.fields.values())).last_time if self.fields else None
+
+    def update(self, hourly: dict, until: Optional[str] = None) -> int:
+        """Push the hours of an environment_full()-style hourly block that are newer than the
+        last pushed hour and not after `until` (forecast hours are skipped). Returns hours pushed.
+        """
+        last = self.last_time
+        pushed = 0
+        for i, t in enumerate(hourly["time"]):
+            if until is not None and t[:16] > until[:16]:
+                break
+            time = datetime.fromisoformat(t)
+            if last is not None and time <= last:
+                continue
+            for name, agg in self.fields.items():
+                agg.push(time, hourly[name][i])
+            pushed += 1
+        return pushed
+
+
+def aggregate_series(hourly: dict) -> dict:
+    """Vectorized aggregates over a stored range, on a gap-free hourly axis (missing hours are null)."""
+    if not hourly["time"]:
+        return {"time": [], "daily": {}, **{name: {} for name in EXCEEDANCE_THRESHOLDS}}
+    parsed = [datetime.fromisoformat(t) for t in hourly["time"]]
+    offsets = np.array([(t - parsed[0]) // timedelta(hours=1) for t in parsed])
+    n = int(offsets[-1]) + 1
+    times = [(parsed[0] + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(n)]
+    out = {"time": times, "daily": {}}
+    for name, threshold in EXCEEDANCE_THRESHOLDS.items():
+        values = np.full(n, np.nan)
+        values[offsets] = np.array([np.nan if v is None else v for v in hourly[name]], dtype=np.float64)
+        fields = {"mean_24h": rolling_mean(values), "nowcast": nowcast(values)}
+        if name == "pm2_5":
+            fields["nowcast_aqi"] = pm25_to_aqi_array(fields["nowcast"])
+        out[name] = {key: to_list(np.round(v, 2)) for key, v in fields.items()}
+        out[name]["exceedance_hours"] = int(np.sum(values > threshold))
+        out["daily"][name] = daily_summary(times, values, threshold)
+    return out
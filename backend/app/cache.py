@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no cross-process fetch locking
+    fcntl = None
+
+
+class TTLCache:
+    """In-process response cache with stale-while-revalidate.
+
+    Entries younger than ttl are fresh. Older entries, up to ttl + stale_ttl, are
+    still served while a single background refresh replaces them. Past that the
+    caller awaits a new fetch; concurrent misses for the same key share one fetch.
+    Failed fetches are never cached. Entries older than max_age_s (at least the
+    largest ttl + stale_ttl used) are purged, and the oldest are dropped past max_entries.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_age_s: float | None = None):
+        self.max_entries = max_entries
+        self.max_age_s = max_age_s
+        # Kept in store-time order, oldest first, so purging only looks at the front
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "refresh_errors": 0, "evictions": 0,
+        }
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < ttl:
+                self.stats["hits"] += 1
+                return entry[1]
+            if age < ttl + stale_ttl:
+                self.stats["stale_hits"] += 1
+                if key not in self._inflight:
+                    self._start(key, fetch, background=True)
+                return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = self._start(key, fetch, background=False)
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Fetch key now, regardless of the age of the cached entry, and cache the result.
+        Joins a fetch already in flight for the key; that one started after the caller's data went stale.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = self._start(key, fetch, background=False)
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _start(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], background: bool) -> asyncio.Task:
+        task = asyncio.ensure_future(self._run(key, fetch, background))
+        self._inflight[key] = task
+        if background:
+            task.add_done_callback(self._background_done)
+        return task
+
+    async def _run(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], background: bool) -> Any:
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+        self.put(key, value)
+        if background:
+            self.stats["refreshes"] += 1
+        return value
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["refresh_errors"] += 1
+
+    def peek(self, key: Hashable, ttl: float) -> Any:
+        """Value for key if it is younger than ttl, else None; counts a hit or a miss."""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            self.stats["hits"] += 1
+            return entry[1]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        self._entries[key] = (now, value)
+        self._purge(now)
+
+    def _purge(self, now: float) -> None:
+        while self._entries:
+            stored_at = next(iter(self._entries.values()))[0]
+            expired = self.max_age_s is not None and now - stored_at >= self.max_age_s
+            if not expired and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._entries)
+        served = stats["hits"] + stats["stale_hits"] + stats["coalesced"]
+        total = served + stats["misses"]
+        stats["hit_ratio"] = round(served / total, 4) if total else None
+        return stats
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SharedFileCache:
+    """Payload cache shared by every worker process on the host.
+
+    Each entry is one file (media type line + body) named by a hash of the key,
+    written atomically with a rename; freshness is the file's mtime. With the
+    directory on tmpfs (/dev/shm) reads come straight from shared page cache.
+    fetch() holds an flock per key so only one process recomputes a missing entry
+    while the others wait for its file. Total size is bounded by pruning oldest files.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int, lock_timeout_s: float = 30.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock_timeout_s = lock_timeout_s
+        self._puts = 0
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "waits": 0, "evictions": 0}
+
+    def _path(self, key: Hashable) -> Path:
+        return self.directory / (hashlib.blake2b(repr(key).encode(), digest_size=20).hexdigest() + ".bin")
+
+    def _read(self, path: Path, max_age_s: float | None) -> tuple[bytes, str] | None:
+        try:
+            with open(path, "rb") as f:
+                if max_age_s is not None and time.time() - os.fstat(f.fileno()).st_mtime >= max_age_s:
+                    return None
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        media_type, _, body = raw.partition(b"\n")
+        return body, media_type.decode()
+
+    def get(self, key: Hashable, max_age_s: float | None = None) -> tuple[bytes, str] | None:
+        entry = self._read(self._path(key), max_age_s)
+        self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    def put(self, key: Hashable, body: bytes, media_type: str) -> None:
+        if len(body) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(media_type.encode() + b"\n")
+                f.write(body)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.stats["writes"] += 1
+        self._puts += 1
+        if self._puts % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    async def fetch(self, key: Hashable, max_age_s: float, produce: Callable[[], Awaitable[bytes]],
+                    media_type: str = "application/octet-stream") -> bytes:
+        """Body for key from the shared directory, or from produce() run by exactly one process."""
+        path = self._path(key)
+        entry = self._read(path, max_age_s)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["misses"] += 1
+        if fcntl is None:
+            body = await produce()
+            self.put(key, body, media_type)
+            return body
+
+        lock = open(path.with_suffix(".lock"), "a+b")
+        try:
+            deadline = time.monotonic() + self.lock_timeout_s
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        break  # Holder is stuck; fetch without the lock
+                    self.stats["waits"] += 1
+                    await asyncio.sleep(0.05)
+            # Another process may have written the entry while we waited
+            entry = self._read(path, max_age_s)
+            if entry is not None:
+                return entry[0]
+            body = await produce()
+            self.put(key, body, media_type)
+            return body
+        finally:
+            lock.close()
+
+    def prune(self) -> None:
+        """Delete the oldest entries until the directory fits in max_bytes."""
+        files = []
+        for path in self.directory.glob("*.bin"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            path.with_suffix(".lock").unlink(missing_ok=True)
+            total -= size
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        stats = dict(self.stats)
+        stats["directory"] = str(self.directory)
+        stats["max_bytes"] = self.max_bytes
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / total, 4) if total else None
+        return stats
+
+
+class LRUBytesCache:
+    """Least-recently-used cache of encoded payloads, bounded by total payload size.
+    With a SharedFileCache behind it, local misses are looked up there and every put is written through.
+    """
+
+    def __init__(self, max_bytes: int, shared: SharedFileCache | None = None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.size_bytes = 0
+        self._entries: "OrderedDict[Hashable, tuple[bytes, str]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "not_modified": 0, "shared_hits": 0}
+
+    def get(self, key: Hashable) -> tuple[bytes, str] | None:
+        entry = self._entries.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.stats["shared_hits"] += 1
+                self._put_local(key, *entry)
+                return entry
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: Hashable, body: bytes, media_type: str) -> None:
+        if self.shared is not None:
+            self.shared.put(key, body, media_type)
+        self._put_local(key, body, media_type)
+
+    def _put_local(self, key: Hashable, body: bytes, media_type: str) -> None:
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size_bytes -= len(old[0])
+        self._entries[key] = (body, media_type)
+        self.size_bytes += len(body)
+        while self.size_bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._entries)
+        stats["size_bytes"] = self.size_bytes
+        stats["max_bytes"] = self.max_bytes
+        total = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["shared_hits"]) / total, 4) if total else None
+        return stats
@@ -0,0 +1,49 @@
+"""Values derived from raw readings: US EPA PM2.5 AQI and wind vectors.
+
+Dependency-free apart from numpy so main, export, locations and aggregates can all
+import it without pulling in each other.
+"""
+import math
+
+import numpy as np
+
+AQI_BREAKPOINTS = (
+    (0.0, 12.0, 0, 50),
+    (12.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 150.4, 151, 200),
+)
+_AQI_BREAKPOINTS = np.array(AQI_BREAKPOINTS)
+
+
+def wind_vector(speed: float, direction: float) -> dict:
+    theta = math.radians(direction + 180)
+    return {
+        "vx": round(speed * math.cos(theta), 3),
+        "vy": round(speed * math.sin(theta), 3),
+    }
+
+
+def pm25_to_aqi(pm: float) -> int:
+    for clo, chi, ilo, ihi in AQI_BREAKPOINTS:
+        if clo <= pm <= chi:
+            return round(((ihi - ilo) / (chi - clo)) * (pm - clo) + ilo)
+    return 300
+
+
+def pm25_to_aqi_array(pm: np.ndarray) -> np.ndarray:
+    """Vectorized pm25_to_aqi; NaN input gives NaN. Values outside every band give 300 like the scalar version."""
+    pm = np.asarray(pm, dtype=np.float64)
+    clo, chi, ilo, ihi = _AQI_BREAKPOINTS.T
+    inside = (clo <= pm[:, None]) & (pm[:, None] <= chi)
+    band = np.argmax(inside, axis=1)
+    aqi = np.round(((ihi[band] - ilo[band]) / (chi[band] - clo[band])) * (pm - clo[band]) + ilo[band])
+    aqi = np.where(inside.any(axis=1), aqi, 300.0)
+    return np.where(np.isnan(pm), np.nan, aqi)
+
+
+def wind_vector_arrays(speed: np.ndarray, direction: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized wind_vector; NaN in either input gives NaN components."""
+    theta = np.radians(np.asarray(direction, dtype=np.float64) + 180)
+    speed = np.asarray(speed, dtype=np.float64)
+    return np.round(speed * np.cos(theta), 3), np.round(speed * np.sin(theta), 3)
@@ -1,5 +1,11 @@
 from math import cos, sin, radians, exp
-from typing import List, Tuple, Dict
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Tuple, Dict, NamedTuple
+
+import numpy as np
 
 # Bursa Nilüfer approximate center
 NILUFER_LAT = 40.232
@@ -25,6 +31,13 @@ def dir_to_compass(deg: float) -> str:
     return dirs[ix]
 
 
+POLLUTANTS = ("pm25", "pm10", "no2", "so2", "co")
+
+# PM2.5 band upper bounds and the colors used by color_scale, in the same order
+COLOR_THRESHOLDS = (12, 35.5, 55.5, 150.5)
+COLOR_BANDS = ("#2ecc71", "#f1c40f", "#e67e22", "#e74c3c", "#8e44ad")
+
+
 def color_scale(pm25: float) -> str:
     # Very simple AQI-like color bands for PM2.5
     if pm25 < 12:
@@ -38,6 +51,15 @@ def color_scale(pm25: float) -> str:
     return "#8e44ad"       # Very unhealthy/hazardous
 
 
+def dispersion_meta(wind_speed: float, wind_dir_deg: float) -> Dict:
+    return {
+        "source": {"lat": NILUFER_LAT, "lng": NILUFER_LNG},
+        "wind_speed": wind_speed,
+        "wind_dir_deg": wind_dir_deg,
+        "wind_dir_compass": dir_to_compass(wind_dir_deg),
+    }
+
+
 def simulate_dispersion(
     wind_speed: float,
     wind_dir_deg: float,
@@ -113,11 +135,544 @@ def simulate_dispersion(
 
             d += step_m
 
-    meta = {
-        "source": {"lat": NILUFER_LAT, "lng": NILUFER_LNG},
-        "wind_speed": wind_speed,
-        "wind_dir_deg": wind_dir_deg,
-        "wind_dir_compass": dir_to_compass(wind_dir_deg),
+    return {"meta": dispersion_meta(wind_speed, wind_dir_deg), "points": points}
+
+
+def color_index(pm25: np.ndarray) -> np.ndarray:
+    """Vectorized color_scale: index into COLOR_BANDS for every PM2.5 value."""
+    return np.searchsorted(np.asarray(COLOR_THRESHOLDS), pm25, side="right").astype(np.uint8)
+
+
+# e-folding distance of the ray model's concentration decay
+DECAY_KM = 2.0
+
+
+def _ray_angles(wind_speed: np.ndarray, wind_dir_deg: np.ndarray, num_rays: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Ray bearings (T, R) around each wind direction and the angular spread (T,) for each wind speed."""
+    spread_deg = np.maximum(15, 60 - wind_speed * 3)
+    half = max(1, num_rays) // 2
+    frac = np.arange(-half, half + 1, dtype=np.float64) / max(1, half)
+    return wind_dir_deg[:, None] + frac[None, :] * spread_deg[:, None], spread_deg
+
+
+def mesh_size(num_rays: int, max_distance_m: int, step_m: int) -> int:
+    """Points of one source's ray mesh for these parameters."""
+    rays = 2 * (max(1, num_rays) // 2) + 1
+    return rays * (max_distance_m // step_m if step_m > 0 else 0)
+
+
+def _distances(max_distance_m: int, step_m: int) -> np.ndarray:
+    if step_m > 0:
+        return np.arange(step_m, max_distance_m + 1, step_m, dtype=np.float64)
+    return np.empty(0, dtype=np.float64)
+
+
+def dispersion_mesh_series(
+    wind_speed: np.ndarray,
+    wind_dir_deg: np.ndarray,
+    base: np.ndarray,
+    num_rays: int = 9,
+    max_distance_m: int = 5000,
+    step_m: int = 500,
+    src_lat: float = NILUFER_LAT,
+    src_lng: float = NILUFER_LNG,
+) -> Dict[str, np.ndarray]:
+    """dispersion_mesh over a time axis in one pass.
+    wind_speed/wind_dir_deg are (T,), base is (T, len(POLLUTANTS)); every returned
+    field is (T, N) except distance_m, which is shared by all frames.
+    """
+    wind_speed = np.asarray(wind_speed, dtype=np.float64).ravel()
+    wind_dir_deg = np.asarray(wind_dir_deg, dtype=np.float64).ravel()
+    base = np.asarray(base, dtype=np.float64).reshape(-1, len(POLLUTANTS))
+    angles, spread_deg = _ray_angles(wind_speed, wind_dir_deg, num_rays)
+    distances = _distances(max_distance_m, step_m)
+
+    lateral_sigma_deg = spread_deg / 2.0
+    lateral_offset = np.abs(angles - wind_dir_deg[:, None])
+    lateral_weight = np.exp(-(lateral_offset ** 2) / (2 * (lateral_sigma_deg[:, None] ** 2) + 1e-6))
+    decay = np.exp(-(distances / 1000.0) / DECAY_KM)
+
+    # [frame, ray, step] flattened to [frame, point]
+    frames = wind_speed.size
+    weight = (lateral_weight[:, :, None] * decay[None, None, :]).reshape(frames, -1)
+    theta = np.radians(angles)[:, :, None]
+    dx = (distances * np.sin(theta)).reshape(frames, -1)
+    dy = (distances * np.cos(theta)).reshape(frames, -1)
+
+    mesh = {"lat": src_lat + dy / M_PER_DEG_LAT, "lng": src_lng + dx / M_PER_DEG_LON}
+    for k, name in enumerate(POLLUTANTS):
+        mesh[name] = base[:, k, None] * weight
+    mesh["distance_m"] = np.tile(distances, angles.shape[1])
+    mesh["color_index"] = color_index(mesh["pm25"])
+    return mesh
+
+
+def mesh_frame(series: Dict[str, np.ndarray], t: int) -> Dict[str, np.ndarray]:
+    """Single frame of a dispersion_mesh_series result, shaped like dispersion_mesh."""
+    return {key: value if key == "distance_m" else value[t] for key, value in series.items()}
+
+
+def dispersion_mesh(
+    wind_speed: float,
+    wind_dir_deg: float,
+    base_pm25: float,
+    base_pm10: float,
+    base_no2: float,
+    base_so2: float,
+    base_co: float,
+    num_rays: int = 9,
+    max_distance_m: int = 5000,
+    step_m: int = 500,
+    src_lat: float = NILUFER_LAT,
+    src_lng: float = NILUFER_LNG,
+) -> Dict[str, np.ndarray]:
+    """Array version of simulate_dispersion: a one-frame dispersion_mesh_series.
+    Evaluates the whole ray x distance mesh at once and returns flat, unrounded
+    arrays in the same ray-major order as the points of simulate_dispersion.
+    """
+    series = dispersion_mesh_series(
+        np.array([wind_speed]), np.array([wind_dir_deg]),
+        np.array([base_pm25, base_pm10, base_no2, base_so2, base_co]),
+        num_rays, max_distance_m, step_m, src_lat, src_lng,
+    )
+    return mesh_frame(series, 0)
+
+
+def simulate_dispersion_fast(
+    wind_speed: float,
+    wind_dir_deg: float,
+    base_pm25: float,
+    base_pm10: float,
+    base_no2: float,
+    base_so2: float,
+    base_co: float,
+    num_rays: int = 9,
+    max_distance_m: int = 5000,
+    step_m: int = 500,
+) -> Dict:
+    """Drop-in replacement for simulate_dispersion backed by dispersion_mesh.
+    simulate_dispersion is kept as the pure-Python reference implementation.
+    """
+    mesh = dispersion_mesh(
+        wind_speed, wind_dir_deg, base_pm25, base_pm10, base_no2, base_so2, base_co,
+        num_rays=num_rays, max_distance_m=max_distance_m, step_m=step_m,
+    )
+    return mesh_to_points(mesh, wind_speed, wind_dir_deg)
+
+
+def mesh_to_points(mesh: Dict[str, np.ndarray], wind_speed: float, wind_dir_deg: float, meta: Dict = None) -> Dict:
+    """Format a mesh as the list-of-dicts payload of simulate_dispersion."""
+    cloud_radius = max(60, int(120 * (1 + wind_speed / 5)))
+    colors = np.asarray(COLOR_BANDS)[mesh["color_index"]].tolist()
+    points = [
+        {
+            "lat": lat,
+            "lng": lng,
+            "pm25": pm25,
+            "pm10": pm10,
+            "no2": no2,
+            "so2": so2,
+            "co": co,
+            "distance_m": d,
+            "cloudRadius": cloud_radius,
+            "color": color,
+        }
+        for lat, lng, pm25, pm10, no2, so2, co, d, color in zip(
+            mesh["lat"].tolist(),
+            mesh["lng"].tolist(),
+            np.round(mesh["pm25"], 2).tolist(),
+            np.round(mesh["pm10"], 2).tolist(),
+            np.round(mesh["no2"], 2).tolist(),
+            np.round(mesh["so2"], 2).tolist(),
+            np.round(mesh["co"], 3).tolist(),
+            mesh["distance_m"].astype(np.int64).tolist(),
+            colors,
+        )
+    ]
+    return {"meta": meta or dispersion_meta(wind_speed, wind_dir_deg), "points": points}
+
+
+# Field order of the columnar/binary /simulate formats
+MESH_FIELDS = ("lat", "lng", "pm25", "pm10", "no2", "so2", "co", "distance_m", "color_index")
+
+# Binary layout (little-endian): 4s magic, u16 version, u16 field count, u32 point count,
+# 4 x f32 (source lat, source lng, wind speed, wind dir), then one f32 array per MESH_FIELDS entry
+MESH_MAGIC = b"NDSP"
+MESH_VERSION = 1
+_MESH_HEADER = struct.Struct("<4sHHI4f")
+
+
+def mesh_to_columns(mesh: Dict[str, np.ndarray], wind_speed: float, wind_dir_deg: float, meta: Dict = None) -> Dict:
+    """Struct-of-arrays response: one list per field instead of one dict per point."""
+    return {
+        "meta": meta or dispersion_meta(wind_speed, wind_dir_deg),
+        "count": int(mesh["lat"].size),
+        "cloudRadius": max(60, int(120 * (1 + wind_speed / 5))),
+        "colors": list(COLOR_BANDS),
+        "columns": {
+            "lat": mesh["lat"].tolist(),
+            "lng": mesh["lng"].tolist(),
+            "pm25": np.round(mesh["pm25"], 2).tolist(),
+            "pm10": np.round(mesh["pm10"], 2).tolist(),
+            "no2": np.round(mesh["no2"], 2).tolist(),
+            "so2": np.round(mesh["so2"], 2).tolist(),
+            "co": np.round(mesh["co"], 3).tolist(),
+            "distance_m": mesh["distance_m"].astype(np.int64).tolist(),
+            "color_index": mesh["color_index"].tolist(),
+        },
     }
 
-    return {"meta": meta, "points": points}
+
+def mesh_to_bytes(mesh: Dict[str, np.ndarray], wind_speed: float, wind_dir_deg: float) -> bytes:
+    """Pack the mesh as a small header followed by float32 columns (see MESH_FIELDS)."""
+    n = int(mesh["lat"].size)
+    header = _MESH_HEADER.pack(
+        MESH_MAGIC, MESH_VERSION, len(MESH_FIELDS), n,
+        NILUFER_LAT, NILUFER_LNG, wind_speed, wind_dir_deg,
+    )
+    body = np.empty((len(MESH_FIELDS), n), dtype="<f4")
+    for i, name in enumerate(MESH_FIELDS):
+        body[i] = mesh[name]
+    return header + body.tobytes()
+
+
+def plume_weight(
+    wind_speed: float,
+    wind_dir_deg: float,
+    lat: np.ndarray,
+    lng: np.ndarray,
+    max_distance_m: float = 5000,
+    src_lat: float = NILUFER_LAT,
+    src_lng: float = NILUFER_LNG,
+) -> np.ndarray:
+    """Continuous form of the ray model: unit concentration at arbitrary points.
+    Uses the same distance decay and lateral weight as simulate_dispersion; points
+    outside the angular spread or beyond max_distance_m get 0. Inputs broadcast.
+    """
+    spread_deg = max(15, 60 - wind_speed * 3)
+    lateral_sigma_deg = spread_deg / 2.0
+    dy = (np.asarray(lat, dtype=np.float64) - src_lat) * M_PER_DEG_LAT
+    dx = (np.asarray(lng, dtype=np.float64) - src_lng) * M_PER_DEG_LON
+    d = np.hypot(dx, dy)
+    bearing = np.degrees(np.arctan2(dx, dy))
+    offset = np.abs((bearing - wind_dir_deg + 180.0) % 360.0 - 180.0)
+    weight = np.exp(-(d / 1000.0) / DECAY_KM) * np.exp(-(offset ** 2) / (2 * (lateral_sigma_deg ** 2) + 1e-6))
+    return np.where((offset <= spread_deg + 1e-6) & (d <= max_distance_m + 1e-3) & (d > 0), weight, 0.0)
+
+
+def grid_axes(bbox: Dict[str, float], width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cell-center latitudes (north to south) and longitudes (west to east) of a bbox grid."""
+    dlat = (bbox["lat_max"] - bbox["lat_min"]) / height
+    dlon = (bbox["lon_max"] - bbox["lon_min"]) / width
+    lats = bbox["lat_max"] - (np.arange(height) + 0.5) * dlat
+    lngs = bbox["lon_min"] + (np.arange(width) + 0.5) * dlon
+    return lats, lngs
+
+
+# Raster layout (little-endian): 4s magic, u16 version, u16 plane count, u32 width, u32 height,
+# 4 x f32 (lat_min, lat_max, lon_min, lon_max), then one row-major f32 plane per RASTER_FIELDS
+# entry with row 0 at lat_max
+RASTER_FIELDS = POLLUTANTS
+RASTER_MAGIC = b"NDRS"
+_RASTER_HEADER = struct.Struct("<4sHHII4f")
+RASTER_CHUNK_ROWS = 256
+
+
+def concentration_raster(
+    bbox: Dict[str, float],
+    width: int,
+    height: int,
+    wind_speed: float,
+    wind_dir_deg: float,
+    base: Dict[str, float],
+    max_distance_m: float = 5000,
+) -> Dict[str, np.ndarray]:
+    """float32 (height, width) plane per pollutant over bbox.
+    The weight is evaluated RASTER_CHUNK_ROWS rows at a time to bound float64 temporaries.
+    """
+    lats, lngs = grid_axes(bbox, width, height)
+    weight = np.empty((height, width), dtype=np.float32)
+    for r0 in range(0, height, RASTER_CHUNK_ROWS):
+        r1 = min(r0 + RASTER_CHUNK_ROWS, height)
+        weight[r0:r1] = plume_weight(wind_speed, wind_dir_deg, lats[r0:r1, None], lngs[None, :], max_distance_m)
+    return {name: weight * np.float32(base[name]) for name in RASTER_FIELDS}
+
+
+def plume_extent(wind_speed: float, wind_dir_deg: float, max_distance_m: float) -> Tuple[float, float, float, float]:
+    """Bounding box (dx_min, dx_max, dy_min, dy_max) in meters of the sector plume_weight can be non-zero in."""
+    spread_deg = max(15, 60 - wind_speed * 3)
+    lo, hi = wind_dir_deg - spread_deg, wind_dir_deg + spread_deg
+    cardinals = np.arange(np.ceil(lo / 90.0), np.floor(hi / 90.0) + 1) * 90.0
+    bearings = np.radians(np.concatenate(([lo, hi], cardinals)))
+    dx = np.append(max_distance_m * np.sin(bearings), 0.0)
+    dy = np.append(max_distance_m * np.cos(bearings), 0.0)
+    pad = 1.0
+    return dx.min() - pad, dx.max() + pad, dy.min() - pad, dy.max() + pad
+
+
+class SourceArrays(NamedTuple):
+    """Point sources as columns: lat (S,), lng (S,), base (S, len(POLLUTANTS))."""
+    lat: np.ndarray
+    lng: np.ndarray
+    base: np.ndarray
+
+
+def superpose_grid(
+    bbox: Dict[str, float],
+    width: int,
+    height: int,
+    wind_speed: float,
+    wind_dir_deg: float,
+    sources: SourceArrays,
+    max_distance_m: float = 5000,
+) -> Dict[str, np.ndarray]:
+    """Summed concentration_raster of many sources.
+    Each source is only evaluated on the grid window covering its plume sector.
+    """
+    lats, lngs = grid_axes(bbox, width, height)
+    total = np.zeros((len(POLLUTANTS), height, width), dtype=np.float32)
+    dx_min, dx_max, dy_min, dy_max = plume_extent(wind_speed, wind_dir_deg, max_distance_m)
+    neg_lats = -lats  # ascending, for searchsorted
+    for i in range(sources.lat.size):
+        r0, r1 = np.searchsorted(
+            neg_lats, [-(sources.lat[i] + dy_max / M_PER_DEG_LAT), -(sources.lat[i] + dy_min / M_PER_DEG_LAT)]
+        )
+        c0, c1 = np.searchsorted(
+            lngs, [sources.lng[i] + dx_min / M_PER_DEG_LON, sources.lng[i] + dx_max / M_PER_DEG_LON]
+        )
+        if r0 >= r1 or c0 >= c1:
+            continue
+        weight = plume_weight(
+            wind_speed, wind_dir_deg, lats[r0:r1, None], lngs[None, c0:c1], max_distance_m,
+            src_lat=sources.lat[i], src_lng=sources.lng[i],
+        ).astype(np.float32)
+        total[:, r0:r1, c0:c1] += sources.base[i].astype(np.float32)[:, None, None] * weight
+    return {name: total[k] for k, name in enumerate(POLLUTANTS)}
+
+
+def raster_to_bytes(planes: Dict[str, np.ndarray], bbox: Dict[str, float]) -> bytes:
+    height, width = planes[RASTER_FIELDS[0]].shape
+    header = _RASTER_HEADER.pack(
+        RASTER_MAGIC, 1, len(RASTER_FIELDS), width, height,
+        bbox["lat_min"], bbox["lat_max"], bbox["lon_min"], bbox["lon_max"],
+    )
+    return header + b"".join(planes[name].astype("<f4").tobytes() for name in RASTER_FIELDS)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def pm25_to_png(pm25: np.ndarray, alpha: int = 160) -> bytes:
+    """Indexed PNG of a PM2.5 plane using the color_scale bands; cells with no plume are transparent."""
+    height, width = pm25.shape
+    index = color_index(pm25) + 1
+    index[pm25 <= 0] = 0
+    rows = np.zeros((height, width + 1), dtype=np.uint8)  # leading filter byte 0 per row
+    rows[:, 1:] = index
+    palette = b"\x00\x00\x00" + b"".join(bytes.fromhex(c[1:]) for c in COLOR_BANDS)
+    trns = bytes([0] + [alpha] * len(COLOR_BANDS))
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+        _png_chunk(b"PLTE", palette),
+        _png_chunk(b"tRNS", trns),
+        _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def superpose_points(
+    sources: SourceArrays,
+    lat: np.ndarray,
+    lng: np.ndarray,
+    wind_speed: float,
+    wind_dir_deg: float,
+    max_distance_m: float = 5000,
+) -> np.ndarray:
+    """Summed contribution of all sources at arbitrary points, shape (len(POLLUTANTS), N).
+    Points are sorted by latitude once so every source only visits the points in
+    the latitude band of its plume sector.
+    """
+    lat = np.asarray(lat, dtype=np.float64).ravel()
+    lng = np.asarray(lng, dtype=np.float64).ravel()
+    total = np.zeros((len(POLLUTANTS), lat.size))
+    order = np.argsort(lat, kind="stable")
+    lat_sorted = lat[order]
+    dx_min, dx_max, dy_min, dy_max = plume_extent(wind_speed, wind_dir_deg, max_distance_m)
+    for i in range(sources.lat.size):
+        lo, hi = np.searchsorted(
+            lat_sorted, [sources.lat[i] + dy_min / M_PER_DEG_LAT, sources.lat[i] + dy_max / M_PER_DEG_LAT]
+        )
+        idx = order[lo:hi]
+        dlng = lng[idx] - sources.lng[i]
+        idx = idx[(dlng >= dx_min / M_PER_DEG_LON) & (dlng <= dx_max / M_PER_DEG_LON)]
+        if idx.size == 0:
+            continue
+        weight = plume_weight(
+            wind_speed, wind_dir_deg, lat[idx], lng[idx], max_distance_m,
+            src_lat=sources.lat[i], src_lng=sources.lng[i],
+        )
+        total[:, idx] += sources.base[i][:, None] * weight[None, :]
+    return total
+
+
+def multi_source_mesh(
+    sources: SourceArrays,
+    wind_speed: float,
+    wind_dir_deg: float,
+    num_rays: int = 9,
+    max_distance_m: int = 5000,
+    step_m: int = 500,
+) -> Dict[str, np.ndarray]:
+    """Ray meshes of every source, concatenated, carrying the summed concentration of all sources."""
+    geometry = [
+        dispersion_mesh(
+            wind_speed, wind_dir_deg, 0.0, 0.0, 0.0, 0.0, 0.0,
+            num_rays=num_rays, max_distance_m=max_distance_m, step_m=step_m,
+            src_lat=float(sources.lat[i]), src_lng=float(sources.lng[i]),
+        )
+        for i in range(sources.lat.size)
+    ]
+    mesh = {
+        key: np.concatenate([g[key] for g in geometry]) if geometry else np.empty(0)
+        for key in ("lat", "lng", "distance_m")
+    }
+    total = superpose_points(sources, mesh["lat"], mesh["lng"], wind_speed, wind_dir_deg, max_distance_m)
+    for k, name in enumerate(POLLUTANTS):
+        mesh[name] = total[k]
+    mesh["color_index"] = color_index(mesh["pm25"])
+    return mesh
+
+
+class KernelTable:
+    """Unit-emission meshes per binned (wind speed, wind direction) and mesh shape.
+
+    Every pollutant of dispersion_mesh is base * weight, where weight and the
+    geometry only depend on the wind and mesh parameters. Storing the weight for
+    each bin turns a simulation into five multiplies. Kernels are computed lazily
+    (or in bulk by warm) and the least recently used ones are dropped once their
+    arrays add up to more than max_bytes. Safe to share between threadpool threads.
+    """
+
+    def __init__(self, speed_step: float = 0.5, dir_step: float = 5.0, max_bytes: int = 128 * 1024 * 1024):
+        self.speed_step = speed_step
+        self.dir_step = dir_step
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._kernels: "OrderedDict[tuple, Dict[str, np.ndarray]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        # Guards _kernels, size_bytes and stats; kernels are computed outside it
+        self._lock = threading.Lock()
+
+    def bin(self, wind_speed: float, wind_dir_deg: float) -> Tuple[float, float]:
+        speed = round(wind_speed / self.speed_step) * self.speed_step
+        direction = (round(wind_dir_deg / self.dir_step) * self.dir_step) % 360.0
+        return float(speed), float(direction)
+
+    @staticmethod
+    def _nbytes(kernel: Dict[str, np.ndarray]) -> int:
+        return sum(a.nbytes for a in kernel.values())
+
+    def _store(self, key: tuple, kernel: Dict[str, np.ndarray]) -> None:
+        """Insert under the caller's _lock and evict down to max_bytes."""
+        size = self._nbytes(kernel)
+        if size > self.max_bytes:
+            return
+        old = self._kernels.pop(key, None)
+        if old is not None:
+            self.size_bytes -= self._nbytes(old)
+        self._kernels[key] = kernel
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self._kernels.popitem(last=False)
+            self.size_bytes -= self._nbytes(evicted)
+            self.stats["evictions"] += 1
+
+    def kernel(self, wind_speed: float, wind_dir_deg: float, num_rays: int = 9,
+               max_distance_m: int = 5000, step_m: int = 500) -> Dict[str, np.ndarray]:
+        speed, direction = self.bin(wind_speed, wind_dir_deg)
+        key = (speed, direction, num_rays, max_distance_m, step_m)
+        with self._lock:
+            kernel = self._kernels.get(key)
+            if kernel is not None:
+                self._kernels.move_to_end(key)
+                self.stats["hits"] += 1
+                return kernel
+            self.stats["misses"] += 1
+        unit = dispersion_mesh(
+            speed, direction, 1.0, 0.0, 0.0, 0.0, 0.0,
+            num_rays=num_rays, max_distance_m=max_distance_m, step_m=step_m,
+        )
+        kernel = {"lat": unit["lat"], "lng": unit["lng"], "distance_m": unit["distance_m"], "weight": unit["pm25"]}
+        with self._lock:
+            self._store(key, kernel)
+        return kernel
+
+    def warm(self, max_speed: float, num_rays: int = 9, max_distance_m: int = 5000, step_m: int = 500) -> int:
+        """Precompute every bin from 0 to max_speed and all directions in one vectorized pass."""
+        speeds = np.arange(0.0, max_speed + self.speed_step / 2, self.speed_step)
+        dirs = np.arange(0.0, 360.0, self.dir_step)
+        speed_grid, dir_grid = (a.ravel() for a in np.meshgrid(speeds, dirs, indexing="ij"))
+        base = np.zeros((speed_grid.size, len(POLLUTANTS)))
+        base[:, 0] = 1.0
+        series = dispersion_mesh_series(speed_grid, dir_grid, base, num_rays, max_distance_m, step_m)
+        # Copies, not views into series, so evicting a warmed kernel frees its memory
+        for t in range(speed_grid.size):
+            speed, direction = self.bin(speed_grid[t], dir_grid[t])
+            kernel = {
+                "lat": series["lat"][t].copy(),
+                "lng": series["lng"][t].copy(),
+                "distance_m": series["distance_m"].copy(),
+                "weight": series["pm25"][t].copy(),
+            }
+            with self._lock:
+                self._store((speed, direction, num_rays, max_distance_m, step_m), kernel)
+        return speed_grid.size
+
+    def mesh(self, wind_speed: float, wind_dir_deg: float, base: Dict[str, float], num_rays: int = 9,
+             max_distance_m: int = 5000, step_m: int = 500) -> Dict[str, np.ndarray]:
+        """dispersion_mesh computed from the binned kernel: one multiply per pollutant."""
+        kernel = self.kernel(wind_speed, wind_dir_deg, num_rays, max_distance_m, step_m)
+        mesh = {"lat": kernel["lat"], "lng": kernel["lng"], "distance_m": kernel["distance_m"]}
+        for name in POLLUTANTS:
+            mesh[name] = base[name] * kernel["weight"]
+        mesh["color_index"] = color_index(mesh["pm25"])
+        return mesh
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats, kernels, size_bytes = dict(self.stats), len(self._kernels), self.size_bytes
+        total = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "kernels": kernels,
+            "size_bytes": size_bytes,
+            "max_bytes": self.max_bytes,
+            "speed_step": self.speed_step,
+            "dir_step": self.dir_step,
+            "hit_ratio": round(stats["hits"] / total, 4) if total else None,
+        }
+
+
+def quantize_frames(frames: np.ndarray, dtype: str = "uint16", delta: bool = False,
+                    factors: np.ndarray = None) -> Tuple[np.ndarray, float]:
+    """Quantize (T, ...) non-negative frames to unsigned integers with one scale for the whole sequence.
+    value ~= q * scale. With factors (T,), frame t stands for frames[t] * factors[t], so a
+    shared unit field can be scaled per frame without materializing the products.
+    Frames are quantized one at a time straight into the output, with no float copy of the stack.
+    With delta, frame t holds q[t] - q[t-1] modulo 2**bits, which the client undoes with a
+    running sum in the same integer type.
+    """
+    levels = np.iinfo(dtype).max
+    factors = np.ones(len(frames)) if factors is None else np.asarray(factors, dtype=np.float64)
+    peaks = [float(frame.max()) * factor if frame.size else 0.0 for frame, factor in zip(frames, factors)]
+    peak = max(peaks, default=0.0)
+    scale = peak / levels if peak > 0 else 1.0
+    q = np.empty(frames.shape, dtype=dtype)
+    previous = None
+    for t, frame in enumerate(frames):
+        current = np.rint(frame * np.float32(factors[t] / scale)).astype(dtype)
+        q[t] = current - previous if delta and previous is not None else current  # wraps modulo 2**bits
+        previous = current
+    return q, scale
@@ -0,0 +1,296 @@
+"""CSV and Excel export machinery.
+
+Imported lazily by the /export/* routes so pandas and openpyxl are only loaded
+by workers that actually export; openpyxl is deferred further, to write_excel.
+"""
+import csv
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .derived import pm25_to_aqi_array, wind_vector_arrays
+from .metrics import export_span
+
+
+def range_tag(times: list) -> str:
+    """File name part covering a series, so re-exporting the same window overwrites one file."""
+    if not times:
+        return "empty"
+    tag = times[0] if times[0] == times[-1] else f"{times[0]}_{times[-1]}"
+    return tag.replace(":", "").replace("-", "")
+
+
+def _ensure_csv_directory():
+    """Create csv_data directory if it doesn't exist"""
+    csv_dir = Path("csv_data")
+    csv_dir.mkdir(exist_ok=True)
+    return csv_dir
+
+
+def save_current_data_to_csv(data: dict, filename: str = None):
+    """Save current environment data to CSV"""
+    if filename is None:
+        filename = f"environment_current_{range_tag([data.get('timestamp') or ''])}.csv"
+    
+    csv_dir = _ensure_csv_directory()
+    filepath = csv_dir / filename
+    
+    # Extract relevant data
+    csv_data = {
+        "timestamp": [data.get("timestamp")],
+        "city": [data["location"]["city"]],
+        "district": [data["location"]["district"]],
+        "latitude": [data["location"]["lat"]],
+        "longitude": [data["location"]["lon"]],
+        "pm2_5": [data["air_quality"]["pm2_5"]],
+        "pm10": [data["air_quality"]["pm10"]],
+        "no2": [data["air_quality"]["no2"]],
+        "so2": [data["air_quality"]["so2"]],
+        "co": [data["air_quality"]["co"]],
+        "aqi": [data["air_quality"]["aqi"]],
+        "wind_speed": [data["wind"]["speed"]],
+        "wind_direction": [data["wind"]["direction"]],
+        "wind_vx": [data["wind"]["vector"]["vx"]],
+        "wind_vy": [data["wind"]["vector"]["vy"]],
+    }
+    
+    df = pd.DataFrame(csv_data)
+    df.to_csv(filepath, index=False, encoding='utf-8-sig')
+    return str(filepath)
+
+
+def save_hourly_data_to_csv(data: dict, filename: str = None):
+    """Save hourly environment data to CSV"""
+    if filename is None:
+        filename = f"environment_hourly_{range_tag(data['hourly']['time'])}.csv"
+    
+    csv_dir = _ensure_csv_directory()
+    filepath = csv_dir / filename
+    
+    # Extract hourly data
+    hourly_data = data["hourly"]
+    csv_data = {
+        "time": hourly_data["time"],
+        "pm2_5": hourly_data["pm2_5"],
+        "pm10": hourly_data["pm10"],
+        "wind_speed": hourly_data["wind_speed"],
+        "wind_direction": hourly_data["wind_direction"],
+        "city": [data["location"]["city"]] * len(hourly_data["time"]),
+        "district": [data["location"]["district"]] * len(hourly_data["time"]),
+        "latitude": [data["location"]["lat"]] * len(hourly_data["time"]),
+        "longitude": [data["location"]["lon"]] * len(hourly_data["time"]),
+    }
+    
+    df = pd.DataFrame(csv_data)
+    df.to_csv(filepath, index=False, encoding='utf-8-sig')
+    return str(filepath)
+
+
+def _float_array(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def hourly_frame(location: dict, time, pm25, pm10, wind_speed, wind_direction, label: str = "hourly") -> pd.DataFrame:
+    """Comprehensive-export rows for an hourly series, with AQI and wind vector computed over whole arrays."""
+    pm25 = _float_array(pm25)
+    wind_speed = _float_array(wind_speed)
+    wind_direction = _float_array(wind_direction)
+    vx, vy = wind_vector_arrays(wind_speed, wind_direction)
+    n = len(time)
+    return pd.DataFrame({
+        "data_type": label,
+        "timestamp": time,
+        "city": location["city"],
+        "district": location["district"],
+        "latitude": location["lat"],
+        "longitude": location["lon"],
+        "pm2_5": pm25,
+        "pm10": _float_array(pm10),
+        "no2": np.full(n, np.nan),  # Hourly data doesn't include these
+        "so2": np.full(n, np.nan),
+        "co": np.full(n, np.nan),
+        "aqi": pd.array(pm25_to_aqi_array(pm25), dtype="Int64"),
+        "wind_speed": wind_speed,
+        "wind_direction": wind_direction,
+        "wind_vx": vx,
+        "wind_vy": vy,
+    }, index=pd.RangeIndex(n))
+
+
+def comprehensive_frame(data: dict, current_label: str = "current", hourly_label: str = "hourly") -> pd.DataFrame:
+    """Current reading as the first row followed by every hourly row; shared by the CSV and Excel exporters."""
+    current = data["current"]
+    current_row = pd.DataFrame([{
+        "data_type": current_label,
+        "timestamp": current["timestamp"],
+        "city": data["location"]["city"],
+        "district": data["location"]["district"],
+        "latitude": data["location"]["lat"],
+        "longitude": data["location"]["lon"],
+        "pm2_5": current["air_quality"]["pm2_5"],
+        "pm10": current["air_quality"]["pm10"],
+        "no2": current["air_quality"]["no2"],
+        "so2": current["air_quality"]["so2"],
+        "co": current["air_quality"]["co"],
+        "aqi": current["air_quality"]["aqi"],
+        "wind_speed": current["wind"]["speed"],
+        "wind_direction": current["wind"]["direction"],
+        "wind_vx": current["wind"]["vector"]["vx"],
+        "wind_vy": current["wind"]["vector"]["vy"],
+    }]).astype({"aqi": "Int64"})
+    hourly = data["hourly"]
+    hourly_rows = hourly_frame(
+        data["location"], hourly["time"], hourly["pm2_5"], hourly["pm10"],
+        hourly["wind_speed"], hourly["wind_direction"], label=hourly_label,
+    )
+    return pd.concat([current_row, hourly_rows], ignore_index=True)
+
+
+def save_comprehensive_data_to_csv(data: dict, filename: str = None):
+    """Save all environment data (current + hourly) to a single CSV"""
+    if filename is None:
+        filename = f"environment_comprehensive_{range_tag(data['hourly']['time'])}.csv"
+    
+    csv_dir = _ensure_csv_directory()
+    filepath = csv_dir / filename
+    
+    with export_span("csv", file=str(filepath)) as record:
+        df = comprehensive_frame(data)
+        df.to_csv(filepath, index=False, encoding='utf-8-sig')
+        record["rows"] = len(df)
+    return str(filepath)
+
+
+# Turkish column headers
+TURKISH_HEADERS = {
+    "data_type": "Veri Tipi",
+    "timestamp": "Zaman Damgası",
+    "city": "Şehir",
+    "district": "İlçe",
+    "latitude": "Enlem",
+    "longitude": "Boylam",
+    "pm2_5": "PM2.5 (µg/m³)",
+    "pm10": "PM10 (µg/m³)",
+    "no2": "NO2 (µg/m³)",
+    "so2": "SO2 (µg/m³)",
+    "co": "CO (µg/m³)",
+    "aqi": "Hava Kalitesi İndeksi",
+    "wind_speed": "Rüzgar Hızı (m/s)",
+    "wind_direction": "Rüzgar Yönü (°)",
+    "wind_vx": "Rüzgar Vektörü X",
+    "wind_vy": "Rüzgar Vektörü Y"
+}
+
+# Column widths for better readability
+EXCEL_COLUMN_WIDTHS = {
+    'A': 12,  # Veri Tipi
+    'B': 20,  # Zaman Damgası
+    'C': 10,  # Şehir
+    'D': 10,  # İlçe
+    'E': 12,  # Enlem
+    'F': 12,  # Boylam
+    'G': 15,  # PM2.5
+    'H': 15,  # PM10
+    'I': 15,  # NO2
+    'J': 15,  # SO2
+    'K': 15,  # CO
+    'L': 20,  # Hava Kalitesi İndeksi
+    'M': 18,  # Rüzgar Hızı
+    'N': 18,  # Rüzgar Yönü
+    'O': 15,  # Rüzgar Vektörü X
+    'P': 15,  # Rüzgar Vektörü Y
+}
+
+EXCEL_SHEET_NAME = 'Hava Kalitesi Verileri'
+
+
+def write_excel(filepath, frames) -> int:
+    """Write comprehensive frames to an xlsx with a write-only workbook.
+    Rows are flushed to disk as they are appended, so memory does not grow with row count.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+
+    with export_span("xlsx", file=str(filepath)) as record:
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(EXCEL_SHEET_NAME)
+        for col, width in EXCEL_COLUMN_WIDTHS.items():
+            worksheet.column_dimensions[col].width = width
+
+        header = []
+        for title in TURKISH_HEADERS.values():
+            cell = WriteOnlyCell(worksheet, value=title)
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal="center")
+            header.append(cell)
+        worksheet.append(header)
+
+        rows = 0
+        for frame in frames:
+            frame = frame.astype(object).where(frame.notna(), None)
+            for row in frame.itertuples(index=False, name=None):
+                worksheet.append(row)
+            rows += len(frame)
+        workbook.save(filepath)
+        record["rows"] = rows
+    return rows
+
+
+def save_comprehensive_data_to_excel(data: dict, filename: str = None):
+    """Save all environment data (current + hourly) to a single Excel file with Turkish headers"""
+    if filename is None:
+        filename = f"environment_comprehensive_{range_tag(data['hourly']['time'])}.xlsx"
+    
+    excel_dir = _ensure_csv_directory()
+    filepath = excel_dir / filename
+    
+    write_excel(filepath, [comprehensive_frame(data, current_label="Mevcut", hourly_label="Saatlik")])
+    return str(filepath)
+
+
+HOURLY_COLUMNS = ["time", "pm2_5", "pm10", "wind_speed", "wind_direction", "city", "district", "latitude", "longitude"]
+
+
+def _csv_chunk(rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def iter_comprehensive_frames(store, location_id: str, env: dict, start: str | None, end: str | None,
+                              current_label: str = "current", hourly_label: str = "hourly"):
+    """Current row, then the stored hourly rows for the range, one store batch per frame."""
+    yield comprehensive_frame(
+        {**env, "hourly": {"time": [], "pm2_5": [], "pm10": [], "wind_speed": [], "wind_direction": []}},
+        current_label=current_label,
+    )
+    for batch in store.iter_hourly(location_id, start, end):
+        time, pm25, pm10, speed, direction = zip(*batch)
+        yield hourly_frame(env["location"], list(time), pm25, pm10, speed, direction, label=hourly_label)
+
+
+def iter_comprehensive_csv(store, location_id: str, env: dict, start: str | None, end: str | None):
+    """Same columns and rows as save_comprehensive_data_to_csv, one store batch at a time."""
+    with export_span("csv_stream", start=start, end=end, rows=0) as record:
+        frames = iter_comprehensive_frames(store, location_id, env, start, end)
+        first = next(frames)
+        record["rows"] += len(first)
+        yield "\ufeff" + first.to_csv(index=False)
+        for frame in frames:
+            record["rows"] += len(frame)
+            yield frame.to_csv(index=False, header=False)
+
+
+def iter_hourly_csv(store, location_id: str, env: dict, start: str | None, end: str | None):
+    """Same columns as save_hourly_data_to_csv, one store batch at a time."""
+    loc = env["location"]
+    with export_span("csv_hourly_stream", start=start, end=end, rows=0) as record:
+        yield "\ufeff" + _csv_chunk([HOURLY_COLUMNS])
+        for batch in store.iter_hourly(location_id, start, end):
+            record["rows"] += len(batch)
+            yield _csv_chunk(
+                [*row, loc["city"], loc["district"], loc["lat"], loc["lon"]] for row in batch
+            )
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Latest result of an upstream fetch, refreshed in the background on a wall-clock schedule.
+
+    Refreshes run at every multiple of interval_s plus offset_s (e.g. a few minutes
+    after each quarter hour, once Open-Meteo has published). Concurrent callers that
+    need a refresh share one in-flight fetch (singleflight).
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Any]], interval_s: float, offset_s: float = 0.0, max_age_s: float = None):
+        self._fetch = fetch
+        self.interval_s = interval_s
+        self.offset_s = offset_s
+        self.max_age_s = max_age_s if max_age_s is not None else 2 * interval_s
+        self._value: Any = None
+        self._fetched_at: float | None = None
+        self._fetched_wall: datetime | None = None
+        self._inflight: asyncio.Task | None = None
+        self._runner: asyncio.Task | None = None
+        self.stats = {"refreshes": 0, "errors": 0, "coalesced": 0}
+        self.last_error: str | None = None
+        self._listeners: list[Callable[[Any], None]] = []
+
+    def on_refresh(self, listener: Callable[[Any], None]) -> None:
+        """Call listener with every new value after a successful refresh."""
+        self._listeners.append(listener)
+
+    async def get(self) -> Any:
+        if self._value is None or self.age_s() > self.max_age_s:
+            return await self.refresh()
+        return self._value
+
+    async def refresh(self) -> Any:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._do_refresh())
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(self._inflight)
+
+    async def _do_refresh(self) -> Any:
+        try:
+            value = await self._fetch()
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.last_error = str(e)
+            raise
+        finally:
+            self._inflight = None
+        self._value = value
+        self._fetched_at = time.monotonic()
+        self._fetched_wall = datetime.now(timezone.utc)
+        self.stats["refreshes"] += 1
+        self.last_error = None
+        for listener in self._listeners:
+            try:
+                listener(value)
+            except Exception:
+                logger.exception("Snapshot listener failed")
+        return value
+
+    def age_s(self) -> float | None:
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    def info(self) -> dict:
+        age = self.age_s()
+        return {
+            "fetched_at": None if self._fetched_wall is None else self._fetched_wall.isoformat(),
+            "age_s": None if age is None else round(age, 1),
+        }
+
+    def seconds_until_next_tick(self) -> float:
+        now = time.time()
+        next_tick = (now - self.offset_s) // self.interval_s * self.interval_s + self.interval_s + self.offset_s
+        return max(0.0, next_tick - now)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduled refresh failed; keeping the previous snapshot")
+            await asyncio.sleep(self.seconds_until_next_tick())
+
+    def start(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
@@ -0,0 +1,170 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+# Equirectangular projection is accurate to well under 1% over a district-sized area
+M_PER_DEG_LAT = 111_320.0
+
+
+class SpatialIndex:
+    """KD-tree over measurement points for batch interpolation at arbitrary locations.
+
+    The tree depends on coordinates only, so it is reused while readings change; points
+    without coordinates are dropped. Values are passed per query, aligned with the points
+    given here, and every field skips the neighbours where it is missing (NaN), so a
+    station reporting only PM2.5 still contributes to PM2.5. Coordinates are projected to
+    local meters around the mean latitude so distances are isotropic.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray):
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        self.keep = np.isfinite(lat) & np.isfinite(lng)
+        self.size = int(self.keep.sum())
+        if self.size == 0:
+            raise ValueError("No measurement points with coordinates")
+        self.lat0 = float(lat[self.keep].mean())
+        self.m_per_deg_lng = M_PER_DEG_LAT * np.cos(np.radians(self.lat0))
+        self.xy = self._project(lat[self.keep], lng[self.keep])
+        # scipy is only needed once /interpolate is used; keep it out of worker start-up
+        from scipy.spatial import cKDTree
+
+        self.tree = cKDTree(self.xy)
+
+    def _project(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        return np.column_stack((
+            np.asarray(lng, dtype=np.float64) * self.m_per_deg_lng,
+            np.asarray(lat, dtype=np.float64) * M_PER_DEG_LAT,
+        ))
+
+    def _field_groups(self, values: Dict[str, np.ndarray]):
+        """Yield (valid mask over the indexed points, {name: values}) per distinct missing-value pattern."""
+        groups: Dict[bytes, tuple] = {}
+        for name, v in values.items():
+            v = np.asarray(v, dtype=np.float64)[self.keep]
+            valid = np.isfinite(v)
+            groups.setdefault(valid.tobytes(), (valid, {}))[1][name] = v
+        return groups.values()
+
+    def _neighbors(self, lat: np.ndarray, lng: np.ndarray, k: int, valid: np.ndarray | None = None):
+        """k nearest points (distance order) among those flagged valid; queries enough extra
+        neighbours that skipping the invalid ones still leaves k.
+        """
+        available = self.size if valid is None else int(valid.sum())
+        k = max(1, min(k, available))
+        k_query = min(self.size, k + self.size - available)
+        dist, idx = self.tree.query(self._project(lat, lng), k=k_query)
+        dist, idx = dist.reshape(len(dist), k_query), idx.reshape(len(idx), k_query)
+        if k_query == k:
+            return dist, idx
+        # Stable sort moves each row's valid neighbours to the front, still nearest first
+        order = np.argsort(~valid[idx], axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(dist, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+    def idw(self, lat: np.ndarray, lng: np.ndarray, values: Dict[str, np.ndarray],
+            k: int = 8, power: float = 2.0) -> Dict[str, np.ndarray]:
+        """Inverse-distance weighting over the k nearest points with a value; exact at the data points.
+        Fields with no value at any point come back as NaN.
+        """
+        result = {}
+        for valid, fields in self._field_groups(values):
+            if not valid.any():
+                result.update({name: np.full(len(lat), np.nan) for name in fields})
+                continue
+            dist, idx = self._neighbors(lat, lng, k, valid)
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / dist ** power
+            exact = dist[:, 0] == 0
+            weights[exact] = 0.0
+            weights[exact, 0] = 1.0
+            weights /= weights.sum(axis=1, keepdims=True)
+            for name, v in fields.items():
+                result[name] = (weights * np.nan_to_num(v)[idx]).sum(axis=1)
+        return {name: result[name] for name in values}
+
+    def kriging(self, lat: np.ndarray, lng: np.ndarray, values: Dict[str, np.ndarray], k: int = 16,
+                length_scale_m: float | None = None, nugget: float = 1e-3) -> Dict[str, np.ndarray]:
+        """Local ordinary kriging (a Gaussian-process mean with unknown constant) over the k nearest points.
+
+        Uses an exponential correlation exp(-d / length_scale_m); fields missing at the same
+        points share one batched solve. Also returns the relative kriging variance ("variance",
+        0 at a data point, ~1 far from data) of the field with the most values.
+        """
+        if length_scale_m is None:
+            length_scale_m = self.default_length_scale()
+        result, variance, best = {}, np.full(len(lat), np.nan), 0
+        for valid, fields in self._field_groups(values):
+            if not valid.any():
+                result.update({name: np.full(len(lat), np.nan) for name in fields})
+                continue
+            dist, idx = self._neighbors(lat, lng, k, valid)
+            weights, var = self._kriging_weights(dist, idx, length_scale_m, nugget)
+            for name, v in fields.items():
+                result[name] = (weights * np.nan_to_num(v)[idx]).sum(axis=1)
+            if valid.sum() > best:
+                best, variance = int(valid.sum()), var
+        result = {name: result[name] for name in values}
+        result["variance"] = variance
+        return result
+
+    def _kriging_weights(self, dist: np.ndarray, idx: np.ndarray, length_scale_m: float,
+                         nugget: float) -> tuple[np.ndarray, np.ndarray]:
+        n_q, n_k = idx.shape
+        pts = self.xy[idx]
+        pair = np.linalg.norm(pts[:, :, None, :] - pts[:, None, :, :], axis=-1)
+
+        # Ordinary kriging system [[C, 1], [1^T, 0]] [w; mu] = [c; 1]
+        a = np.ones((n_q, n_k + 1, n_k + 1))
+        a[:, :n_k, :n_k] = np.exp(-pair / length_scale_m) + nugget * np.eye(n_k)
+        a[:, n_k, n_k] = 0.0
+        b = np.ones((n_q, n_k + 1))
+        b[:, :n_k] = np.exp(-dist / length_scale_m)
+        sol = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+        weights, mu = sol[:, :n_k], sol[:, n_k]
+        variance = np.clip(1.0 + nugget - (weights * b[:, :n_k]).sum(axis=1) - mu, 0.0, None)
+        return weights, variance
+
+    def default_length_scale(self) -> float:
+        """Twice the median nearest-neighbor spacing of the data points."""
+        if self.size < 2:
+            return 1000.0
+        dist, _ = self.tree.query(self.xy, k=2)
+        return float(max(2.0 * np.median(dist[:, 1]), 1.0))
+
+
+def _fingerprint(lat: np.ndarray, lng: np.ndarray) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for arr in (lat, lng):
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+class IndexCache:
+    """Keeps the last few SpatialIndex objects and reuses one while its point coordinates are unchanged.
+    Shared by threadpool threads; trees are built outside the lock.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, SpatialIndex]" = OrderedDict()
+        self.stats = {"hits": 0, "builds": 0}
+        self._lock = threading.Lock()
+
+    def get(self, lat: np.ndarray, lng: np.ndarray) -> SpatialIndex:
+        key = _fingerprint(lat, lng)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return index
+        index = SpatialIndex(lat, lng)
+        with self._lock:
+            self._entries[key] = index
+            self.stats["builds"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
@@ -0,0 +1,135 @@
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .derived import pm25_to_aqi_array, wind_vector_arrays
+
+
+class Location(NamedTuple):
+    id: str
+    city: str
+    district: str
+    name: str
+    lat: float
+    lon: float
+
+    def block(self) -> dict:
+        """The "location" block of an environment_full-style response."""
+        return {"id": self.id, "city": self.city, "district": self.district, "name": self.name, "lat": self.lat, "lon": self.lon}
+
+
+# "nilufer" is the original single point (LAT/LON in main.py) and the store's LOCATION_ID
+DEFAULT_LOCATIONS = (
+    Location("nilufer", "Bursa", "Nilüfer", "Nilüfer", 40.2133, 28.9771),
+    Location("gorukle", "Bursa", "Nilüfer", "Görükle", 40.2290, 28.8390),
+    Location("ozluce", "Bursa", "Nilüfer", "Özlüce", 40.1985, 28.9625),
+    Location("besevler", "Bursa", "Nilüfer", "Beşevler", 40.2200, 28.9650),
+    Location("fethiye", "Bursa", "Nilüfer", "Fethiye", 40.2275, 28.9490),
+    Location("osmangazi", "Bursa", "Osmangazi", "Osmangazi", 40.1950, 29.0600),
+    Location("yildirim", "Bursa", "Yıldırım", "Yıldırım", 40.1900, 29.0850),
+)
+
+
+def load_locations(path: Optional[str] = None) -> Dict[str, Location]:
+    """Registry keyed by id, in file order. `path` (or NILUFER_LOCATIONS_FILE) is a JSON list
+    of objects with the Location fields; without one the built-in DEFAULT_LOCATIONS are used.
+    """
+    path = path or os.environ.get("NILUFER_LOCATIONS_FILE")
+    if not path:
+        return {loc.id: loc for loc in DEFAULT_LOCATIONS}
+    entries = json.loads(Path(path).read_text(encoding="utf-8"))
+    registry = {}
+    for entry in entries:
+        loc = Location(
+            id=str(entry["id"]),
+            city=entry.get("city", "Bursa"),
+            district=entry.get("district", ""),
+            name=entry.get("name", entry["id"]),
+            lat=float(entry["lat"]),
+            lon=float(entry["lon"]),
+        )
+        if loc.id in registry:
+            raise ValueError(f"Duplicate location id: {loc.id}")
+        registry[loc.id] = loc
+    return registry
+
+
+def stack_series(responses: Sequence[dict], section: str, key: str, n: int) -> np.ndarray:
+    """(len(responses), n) float64 buffer of responses[i][section][key][:n]; missing or null values are NaN."""
+    out = np.full((len(responses), n), np.nan)
+    for i, response in enumerate(responses):
+        values = (response.get(section) or {}).get(key) or []
+        values = values[:n]
+        if values:
+            out[i, :len(values)] = np.array(values, dtype=np.float64)
+    return out
+
+
+def stack_current(responses: Sequence[dict], keys: Sequence[str]) -> np.ndarray:
+    """(len(responses),) float64 buffer of the first present key of each "current" block; NaN when absent."""
+    out = np.full(len(responses), np.nan)
+    for i, response in enumerate(responses):
+        current = response.get("current") or {}
+        for key in keys:
+            if key in current:
+                if current[key] is not None:
+                    out[i] = float(current[key])
+                break
+    return out
+
+
+def to_list(values: np.ndarray) -> List:
+    """Buffer row back to a JSON list, NaN as null like the upstream arrays."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+# Keys of a pollutant in an Open-Meteo "current" block, first present wins
+CURRENT_AIR_KEYS = {
+    "pm2_5": ["pm2_5"],
+    "pm10": ["pm10"],
+    "no2": ["nitrogen_dioxide", "no2"],
+    "so2": ["sulphur_dioxide", "so2"],
+    "co": ["carbon_monoxide", "co"],
+}
+
+
+def location_buffers(air_current: list, air_hourly: list, weather: list) -> dict:
+    """Columnar buffers for a batch: row i of every array belongs to the i-th location.
+    Hourly series share one time axis (same past/forecast window for every coordinate)
+    and are cut to the shortest non-empty series, as in main._fetch_environment_full.
+    """
+    time_axis = next(
+        (r["hourly"]["time"] for r in weather + air_hourly if (r.get("hourly") or {}).get("time")), []
+    )
+    series = {
+        "pm2_5": (air_hourly, "pm2_5"),
+        "pm10": (air_hourly, "pm10"),
+        "wind_speed": (weather, "wind_speed_10m"),
+        "wind_direction": (weather, "wind_direction_10m"),
+    }
+    lengths = [len(time_axis)] + [
+        len((r.get("hourly") or {}).get(key) or []) for responses, key in series.values() for r in responses
+    ]
+    lengths = [x for x in lengths if x > 0]
+    n = min(lengths) if lengths else 0
+
+    current = {name: stack_current(air_current, keys) for name, keys in CURRENT_AIR_KEYS.items()}
+    current["wind_speed"] = stack_current(weather, ["wind_speed_10m"])
+    current["wind_direction"] = stack_current(weather, ["wind_direction_10m"])
+    current["aqi"] = pm25_to_aqi_array(current["pm2_5"])
+    current["wind_vx"], current["wind_vy"] = wind_vector_arrays(current["wind_speed"], current["wind_direction"])
+    now = datetime.now(timezone.utc).isoformat()
+    timestamps = [
+        (a.get("current") or {}).get("time") or (w.get("current") or {}).get("time") or now
+        for a, w in zip(air_current, weather)
+    ]
+    return {
+        "time": list(time_axis[:n]),
+        "hourly": {name: stack_series(responses, "hourly", key, n) for name, (responses, key) in series.items()},
+        "current": current,
+        "timestamp": timestamps,
+    }
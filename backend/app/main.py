@@ -1,13 +1,62 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from .schemas import SimulateRequest, HealthResponse
-from .dispersion import simulate_dispersion
-import math
-import requests
-from datetime import datetime, timezone
+from .schemas import SimulateRequest, BatchSimulateRequest, InterpolateRequest, FrameSequenceRequest, HealthResponse
+from .interpolation import IndexCache
+from .locations import CURRENT_AIR_KEYS, load_locations, location_buffers, to_list
+from .derived import pm25_to_aqi, wind_vector
+from .cache import TTLCache, LRUBytesCache, SharedFileCache
+from .ingest import Snapshot
+from .push import Broadcaster
+from .puff import puff_frames
+from .aggregates import EXCEEDANCE_THRESHOLDS, AggregateTracker, aggregate_series
+from .metrics import (
+    UPSTREAM_LATENCY,
+    UPSTREAM_ERRORS,
+    SIMULATE_SECONDS,
+    SIMULATE_POINTS,
+    LatencyMiddleware,
+    cache_collector,
+    configure_span_logging,
+    mark_worker_dead,
+    monitor_event_loop,
+    scrape_registry,
+)
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from .store import TimeSeriesStore
+import numpy as np
+from .dispersion import (
+    dispersion_mesh,
+    mesh_to_columns,
+    mesh_to_bytes,
+    concentration_raster,
+    raster_to_bytes,
+    pm25_to_png,
+    mesh_to_points,
+    multi_source_mesh,
+    superpose_grid,
+    SourceArrays,
+    dispersion_meta,
+    dispersion_mesh_series,
+    mesh_frame,
+    mesh_size,
+    KernelTable,
+    plume_weight,
+    grid_axes,
+    quantize_frames,
+    POLLUTANTS,
+)
+import time
+import json
+import tempfile
+import hashlib
+import importlib
+import gzip
+import httpx
+from datetime import datetime, timedelta, timezone
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-import pandas as pd
 import os
 from pathlib import Path
 
@@ -20,13 +69,27 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             "/health",
+            "/metrics",
             "/environment/full",
             "/test", 
+            "/cache/stats",
             "/environment/bounding-box",
+            "/locations",
+            "/environment/locations",
             "/environment/current",
+            "/events",
+            "/interpolate",
+            "/history",
+            "/aggregates",
             "/simulate",
+            "/simulate/batch",
+            "/simulate/frames",
+            "/raster",
             "/export/csv",
-            "/export/excel"
+            "/export/csv/download",
+            "/export/csv/hourly/download",
+            "/export/excel",
+            "/export/excel/download"
         ]
     }
 
@@ -39,6 +102,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(LatencyMiddleware)
+configure_span_logging()
+
+
+_loop_monitor: asyncio.Task | None = None
+
+
+@app.on_event("startup")
+async def _start_loop_monitor():
+    global _loop_monitor
+    _loop_monitor = asyncio.ensure_future(monitor_event_loop())
+
+
+@app.on_event("shutdown")
+async def _stop_loop_monitor():
+    if _loop_monitor is not None:
+        _loop_monitor.cancel()
+    mark_worker_dead()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, summed over all workers in multi-worker mode (cache_* are per worker)."""
+    return Response(content=generate_latest(scrape_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health():
     return HealthResponse()
@@ -56,27 +145,6 @@ NILUFER_BOUNDING_BOX = {
 }
 
 
-def _wind_vector(speed: float, direction: float) -> dict:
-    theta = math.radians(direction + 180)
-    return {
-        "vx": round(speed * math.cos(theta), 3),
-        "vy": round(speed * math.sin(theta), 3),
-    }
-
-
-def _pm25_to_aqi(pm: float) -> int:
-    breakpoints = [
-        (0.0, 12.0, 0, 50),
-        (12.1, 35.4, 51, 100),
-        (35.5, 55.4, 101, 150),
-        (55.5, 150.4, 151, 200),
-    ]
-    for clo, chi, ilo, ihi in breakpoints:
-        if clo <= pm <= chi:
-            return round(((ihi - ilo) / (chi - clo)) * (pm - clo) + ilo)
-    return 300
-
-
 def _first_present(d: dict, keys: list[str]):
     for k in keys:
         if k in d:
@@ -84,35 +152,110 @@ def _first_present(d: dict, keys: list[str]):
     return None
 
 
-def _get_json(url: str, params: dict, timeout: int):
-    resp = requests.get(url, params=params, timeout=timeout)
+# Upstream endpoints; override to point at a local stub server
+AIR_QUALITY_URL = os.environ.get("OPEN_METEO_AIR_QUALITY_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Open-Meteo refreshes "current" values every 15 minutes and hourly series once an hour
+CURRENT_TTL_S = 300
+HOURLY_TTL_S = 1800
+STALE_TTL_S = 3600
+# Workers run scheduled refreshes on the same wall-clock tick; a shared entry younger than this is from the current one
+REFRESH_SHARED_TTL_S = 60
+
+# Bounds client-driven keys such as multi-location batches
+UPSTREAM_CACHE_MAX_ENTRIES = 512
+
+_upstream_cache = TTLCache(UPSTREAM_CACHE_MAX_ENTRIES, max_age_s=HOURLY_TTL_S + STALE_TTL_S)
+
+# Multi-worker mode (run.py --prod) points every worker at one directory, so upstream
+# snapshots and /simulate results are fetched and computed once per host, not per worker
+SHARED_CACHE_DIR = os.environ.get("NILUFER_SHARED_CACHE_DIR")
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("NILUFER_SHARED_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+_shared_cache = SharedFileCache(SHARED_CACHE_DIR, SHARED_CACHE_MAX_BYTES) if SHARED_CACHE_DIR else None
+
+# Shared upstream client: pooled keep-alive connections and a cap on in-flight requests
+UPSTREAM_CONCURRENCY = 8
+_http_client: httpx.AsyncClient | None = None
+_upstream_slots: asyncio.Semaphore | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _http_client, _upstream_slots
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=UPSTREAM_CONCURRENCY, max_keepalive_connections=UPSTREAM_CONCURRENCY),
+        )
+        _upstream_slots = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+    return _http_client
+
+
+@app.on_event("shutdown")
+async def _close_client():
+    if _http_client is not None:
+        await _http_client.aclose()
+
+
+async def _get_json(url: str, params: dict, timeout: int, refresh: bool = False):
+    """Cached _fetch_json. With refresh, the in-process cache is bypassed and repopulated,
+    and only shared-cache entries written during the current refresh tick are reused.
+    """
+    key = (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+    ttl = HOURLY_TTL_S if "hourly" in params else CURRENT_TTL_S
+    if refresh:
+        return await _upstream_cache.refresh(key, lambda: _fetch_shared_json(key, url, params, timeout, REFRESH_SHARED_TTL_S))
+    return await _upstream_cache.get(key, lambda: _fetch_shared_json(key, url, params, timeout, ttl), ttl=ttl, stale_ttl=STALE_TTL_S)
+
+
+async def _fetch_shared_json(key, url: str, params: dict, timeout: int, ttl: float):
+    """_fetch_json, deduplicated across worker processes through the shared cache when enabled."""
+    if _shared_cache is None:
+        return await _fetch_json(url, params, timeout)
+
+    async def produce() -> bytes:
+        return _encode_json(await _fetch_json(url, params, timeout))
+
+    return json.loads(await _shared_cache.fetch(key, ttl, produce, "application/json"))
+
+
+async def _fetch_json(url: str, params: dict, timeout: int):
+    client = _get_client()
+    async with _upstream_slots:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(url, params=params, timeout=timeout)
+        except httpx.HTTPError as e:
+            UPSTREAM_ERRORS.labels(url, type(e).__name__).inc()
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(url).observe(time.perf_counter() - start)
+    if resp.is_error:
+        UPSTREAM_ERRORS.labels(url, f"http_{resp.status_code}").inc()
     resp.raise_for_status()
     data = resp.json()
     if isinstance(data, dict) and data.get("error") is True:
         reason = data.get("reason") or data.get("message") or "Unknown upstream error"
+        UPSTREAM_ERRORS.labels(url, "api_error").inc()
         raise HTTPException(status_code=502, detail=f"Upstream API error: {reason}")
     return data
 
 
-@app.get("/environment/full")
-async def environment_full():
+async def _fetch_environment_full(refresh: bool = False):
     try:
-        # Make API calls in parallel for better performance
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            air_current_future = executor.submit(
-                _get_json,
-                "https://air-quality-api.open-meteo.com/v1/air-quality",
+        # Make API calls concurrently on the shared client
+        air_current, air_hourly, weather = await asyncio.gather(
+            _get_json(
+                AIR_QUALITY_URL,
                 {
                     "latitude": LAT,
                     "longitude": LON,
                     "current": "pm10,pm2_5,nitrogen_dioxide,sulphur_dioxide,carbon_monoxide",
                 },
                 10,
-            )
-            
-            air_hourly_future = executor.submit(
-                _get_json,
-                "https://air-quality-api.open-meteo.com/v1/air-quality",
+                refresh,
+            ),
+            _get_json(
+                AIR_QUALITY_URL,
                 {
                     "latitude": LAT,
                     "longitude": LON,
@@ -122,11 +265,10 @@ async def environment_full():
                     "domains": "cams_europe",
                 },
                 15,
-            )
-            
-            weather_future = executor.submit(
-                _get_json,
-                "https://api.open-meteo.com/v1/forecast",
+                refresh,
+            ),
+            _get_json(
+                FORECAST_URL,
                 {
                     "latitude": LAT,
                     "longitude": LON,
@@ -136,12 +278,9 @@ async def environment_full():
                     "forecast_days": 3,
                 },
                 15,
-            )
-            
-            # Get results
-            air_current = air_current_future.result()
-            air_hourly = air_hourly_future.result()
-            weather = weather_future.result()
+                refresh,
+            ),
+        )
 
         ac = air_current.get("current") or {}
         current_ts = ac.get("time")
@@ -162,7 +301,7 @@ async def environment_full():
         if wind_speed is None or wind_dir is None:
             raise HTTPException(status_code=502, detail="Upstream API error: missing weather current fields")
 
-        vector = _wind_vector(speed=float(wind_speed), direction=float(wind_dir))
+        vector = wind_vector(speed=float(wind_speed), direction=float(wind_dir))
 
         ah = air_hourly.get("hourly") or {}
         wh = weather.get("hourly") or {}
@@ -202,7 +341,7 @@ async def environment_full():
                     "no2": None if no2 is None else float(no2),
                     "so2": None if so2 is None else float(so2),
                     "co": None if co is None else float(co),
-                    "aqi": _pm25_to_aqi(float(pm25)) if pm25 is not None else None,
+                    "aqi": pm25_to_aqi(float(pm25)) if pm25 is not None else None,
                 },
                 "wind": {
                     "speed": float(wind_speed),
@@ -220,118 +359,601 @@ async def environment_full():
         }
     except HTTPException:
         raise
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Upstream request failed: {e}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Upstream API error: {e}")
 
 
+# Background ingestion: refresh two minutes after every quarter hour, matching the
+# cadence of Open-Meteo "current" values. Each refresh fetches past _upstream_cache, so the
+# snapshot age is the age of the data; request-driven reads then hit the repopulated entries
+INGEST_INTERVAL_S = 900
+INGEST_OFFSET_S = 120
+
+# Every ingested window is upserted here, keyed by (location, hour)
+STORE_PATH = Path(os.environ.get("NILUFER_STORE_PATH", "data/timeseries.sqlite3"))
+LOCATION_ID = "nilufer"
+
+_store = TimeSeriesStore(STORE_PATH)
+
+
+async def _ingest_environment():
+    data = await _fetch_environment_full(refresh=True)
+    await run_in_threadpool(_store.upsert_environment, LOCATION_ID, data)
+    return data
+
+
+_environment = Snapshot(_ingest_environment, interval_s=INGEST_INTERVAL_S, offset_s=INGEST_OFFSET_S)
+
+
+@app.on_event("startup")
+async def _start_ingestion():
+    _environment.start()
+
+
+@app.on_event("shutdown")
+async def _stop_ingestion():
+    await _environment.stop()
+
+
+@app.get("/environment/full")
+async def environment_full():
+    data = await _environment.get()
+    return {**data, "snapshot": _environment.info()}
+
+
+async def _environment_history(start: str | None = None, end: str | None = None) -> dict:
+    """environment_full() with the hourly block read from the store.
+    Without a range, this is the window of the latest snapshot.
+    """
+    env = await environment_full()
+    start, end = _export_range(env, start, end)
+    hourly = await run_in_threadpool(_store.query_hourly, LOCATION_ID, start, end)
+    return {**env, "hourly": hourly}
+
+
+@app.get("/history")
+async def history(start: str | None = None, end: str | None = None):
+    """Stored hourly series for a time range (inclusive ISO times, e.g. 2025-12-01T00:00)."""
+    await environment_full()  # make sure at least one window has been ingested
+    hourly = await run_in_threadpool(_store.query_hourly, LOCATION_ID, start, end)
+    return {
+        "location": LOCATION_ID,
+        "stored": await run_in_threadpool(_store.time_range, LOCATION_ID),
+        "hourly": hourly,
+    }
+
+
+# Running aggregates over observed hours, advanced by every snapshot refresh
+_aggregates = AggregateTracker()
+AGGREGATE_SEED_DAYS = 31
+
+
+def _update_aggregates(data: dict) -> None:
+    until = data["current"]["timestamp"]
+    if _aggregates.last_time is None:
+        # First refresh after start-up: replay stored history so the windows start full
+        seed_from = (datetime.fromisoformat(until[:16]) - timedelta(days=AGGREGATE_SEED_DAYS)).strftime("%Y-%m-%dT%H:%M")
+        _aggregates.update(_store.query_hourly(LOCATION_ID, seed_from, until), until=until)
+    _aggregates.update(data["hourly"], until=until)
+
+
+_environment.on_refresh(_update_aggregates)
+
+
+@app.get("/aggregates")
+async def aggregates(start: str | None = None, end: str | None = None, series: bool = False):
+    """24-hour means, EPA NowCast, daily max/min and exceedance hours (WHO 24-hour guideline levels).
+    `latest` and `daily` come from running state advanced hour by hour at ingestion; with
+    `series` (or a start/end range) the stored history is also recomputed hour by hour in one vectorized pass.
+    """
+    await environment_full()  # make sure at least one window has been ingested
+    latest = {name: agg.snapshot() for name, agg in _aggregates.fields.items()}
+    if "pm2_5" in latest and latest["pm2_5"]["nowcast"] is not None:
+        latest["pm2_5"]["nowcast_aqi"] = pm25_to_aqi(latest["pm2_5"]["nowcast"])
+    result = {
+        "location": LOCATION_ID,
+        "thresholds": EXCEEDANCE_THRESHOLDS,
+        "latest": latest,
+        "daily": {name: agg.daily() for name, agg in _aggregates.fields.items()},
+    }
+    if series or start is not None or end is not None:
+        hourly = await run_in_threadpool(_store.query_hourly, LOCATION_ID, start, end)
+        result["series"] = await run_in_threadpool(aggregate_series, hourly)
+    return result
+
+
+_events = Broadcaster()
+
+
+def _push_state(data: dict) -> dict:
+    """What live clients receive: the environment snapshot plus the plume derived from it.
+    Pollutants missing from the snapshot are null in the plume rather than SimulateRequest defaults.
+    """
+    current = data["current"]
+    aq = current["air_quality"]
+    keys = {"pm25": "pm2_5", "pm10": "pm10", "no2": "no2", "so2": "so2", "co": "co"}
+    req = SimulateRequest(
+        wind_speed=current["wind"]["speed"],
+        wind_dir_deg=current["wind"]["direction"] % 360,
+        **{f"base_{name}": aq[key] or 0.0 for name, key in keys.items()},
+    )
+    mesh, meta = _simulate_mesh(req)
+    plume = mesh_to_columns(mesh, req.wind_speed, req.wind_dir_deg, meta)
+    for name, key in keys.items():
+        if aq[key] is None:
+            plume["columns"][name] = None
+    if aq["pm2_5"] is None:
+        plume["columns"]["color_index"] = None
+    return {
+        **data,
+        "snapshot": {"fetched_at": _environment.info()["fetched_at"]},
+        "plume": plume,
+    }
+
+
+def _publish_environment(data: dict) -> None:
+    _events.publish(_push_state(data))
+
+
+_environment.on_refresh(_publish_environment)
+
+
+@app.get("/events")
+async def events():
+    """Server-sent events: a `snapshot` event with the latest environment and plume on connect,
+    then `update` events after each background refresh: `changed` holds only the fields that changed
+    (null is a value) and `removed` the key paths that disappeared.
+    """
+    return StreamingResponse(
+        _events.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "upstream": _upstream_cache.snapshot(),
+        "bounding_box_cells": _cell_cache.snapshot(),
+        "interpolation_index": dict(_index_cache.stats),
+        "simulate": _simulate_cache.snapshot(),
+        "shared": None if _shared_cache is None else _shared_cache.snapshot(),
+        "frames": _frames_cache.snapshot(),
+        "events": {**_events.stats, "connections": _events.connections},
+        "simulate_kernels": None if _kernels is None else _kernels.snapshot(),
+        "ingestion": {**_environment.info(), **_environment.stats, "last_error": _environment.last_error},
+    }
+
+
 @app.get("/test")
 async def test():
     return {"message": "API is working", "bounding_box": NILUFER_BOUNDING_BOX}
 
+# Open-Meteo accepts comma-separated coordinate lists; keep URLs well under length limits
+BBOX_BATCH_SIZE = 50
+BBOX_MAX_CELLS = 20
+
+_cell_cache = TTLCache(4096, max_age_s=CURRENT_TTL_S)
+
+
+def _bbox_grid(rows: int, cols: int) -> list[tuple[float, float]]:
+    """Cell-center coordinates of a rows x cols grid over NILUFER_BOUNDING_BOX, north-west first."""
+    dlat = (NILUFER_BOUNDING_BOX["lat_max"] - NILUFER_BOUNDING_BOX["lat_min"]) / rows
+    dlon = (NILUFER_BOUNDING_BOX["lon_max"] - NILUFER_BOUNDING_BOX["lon_min"]) / cols
+    return [
+        (
+            round(NILUFER_BOUNDING_BOX["lat_max"] - (i + 0.5) * dlat, 4),
+            round(NILUFER_BOUNDING_BOX["lon_min"] + (j + 0.5) * dlon, 4),
+        )
+        for i in range(rows)
+        for j in range(cols)
+    ]
+
+
+def _point_from_current(lat: float, lon: float, air: dict, weather: dict) -> dict:
+    ac = air.get("current") or {}
+    wc = weather.get("current") or {}
+    pm25 = _first_present(ac, ["pm2_5"])
+    speed = wc.get("wind_speed_10m")
+    direction = wc.get("wind_direction_10m")
+    values = {
+        "pm2_5": pm25,
+        "pm10": _first_present(ac, ["pm10"]),
+        "no2": _first_present(ac, ["nitrogen_dioxide", "no2"]),
+        "so2": _first_present(ac, ["sulphur_dioxide", "so2"]),
+        "co": _first_present(ac, ["carbon_monoxide", "co"]),
+    }
+    return {
+        "lat": lat,
+        "lon": lon,
+        "air_quality": {
+            **{k: None if v is None else float(v) for k, v in values.items()},
+            "aqi": pm25_to_aqi(float(pm25)) if pm25 is not None else None,
+        },
+        "wind": None if speed is None or direction is None else {
+            "speed": float(speed),
+            "direction": int(direction),
+            "vector": wind_vector(speed=float(speed), direction=float(direction)),
+        },
+    }
+
+
+def _coordinate_params(coords: list[tuple[float, float]]) -> dict:
+    """latitude/longitude query parameters of a multi-coordinate Open-Meteo request."""
+    return {
+        "latitude": ",".join(str(lat) for lat, _ in coords),
+        "longitude": ",".join(str(lon) for _, lon in coords),
+    }
+
+
+def _per_coordinate(data, count: int) -> list:
+    """Batched response as one entry per requested coordinate, in request order."""
+    # A single coordinate comes back as an object, several as a list in request order
+    if isinstance(data, dict):
+        data = [data]
+    if len(data) != count:
+        raise HTTPException(status_code=502, detail="Upstream API error: batched response size mismatch")
+    return data
+
+
+async def _fetch_points(coords: list[tuple[float, float]]) -> list[dict]:
+    """Current air quality and wind for many coordinates in one request per upstream API."""
+    params = _coordinate_params(coords)
+    air, weather = await asyncio.gather(
+        _fetch_json(
+            AIR_QUALITY_URL,
+            {
+                **params,
+                "current": "pm10,pm2_5,nitrogen_dioxide,sulphur_dioxide,carbon_monoxide",
+            },
+            15,
+        ),
+        _fetch_json(
+            FORECAST_URL,
+            {
+                **params,
+                "current": "wind_speed_10m,wind_direction_10m",
+            },
+            15,
+        ),
+    )
+    air, weather = _per_coordinate(air, len(coords)), _per_coordinate(weather, len(coords))
+    return [_point_from_current(lat, lon, a, w) for (lat, lon), a, w in zip(coords, air, weather)]
+
+
 @app.get("/environment/bounding-box")
-async def environment_bounding_box():
+async def environment_bounding_box(
+    rows: int = Query(3, ge=1, le=BBOX_MAX_CELLS),
+    cols: int = Query(3, ge=1, le=BBOX_MAX_CELLS),
+):
+    """Current conditions sampled on a rows x cols grid over NILUFER_BOUNDING_BOX.
+    Cells are cached individually; missing cells are fetched in batched multi-coordinate requests.
+    """
+    coords = _bbox_grid(rows, cols)
+    points = {c: _cell_cache.peek(c, CURRENT_TTL_S) for c in coords}
+    missing = [c for c, p in points.items() if p is None]
+    batches = [missing[i:i + BBOX_BATCH_SIZE] for i in range(0, len(missing), BBOX_BATCH_SIZE)]
     try:
-        # Return mock data for immediate response
-        return {
-            "bounding_box": NILUFER_BOUNDING_BOX,
-            "points": [
-                {
-                    "lat": 40.170,
-                    "lon": 28.900,
-                    "air_quality": {"pm2_5": 25.5, "pm10": 35.2, "no2": 18.1, "so2": 6.3, "co": 0.8, "aqi": 78},
-                    "wind": {"speed": 3.2, "direction": 45, "vector": {"vx": -2.3, "vy": -2.3}}
-                },
-                {
-                    "lat": 40.215,
-                    "lon": 28.975,
-                    "air_quality": {"pm2_5": 22.1, "pm10": 30.8, "no2": 16.5, "so2": 5.8, "co": 0.7, "aqi": 71},
-                    "wind": {"speed": 2.8, "direction": 50, "vector": {"vx": -2.1, "vy": -2.1}}
-                },
-                {
-                    "lat": 40.260,
-                    "lon": 29.050,
-                    "air_quality": {"pm2_5": 28.3, "pm10": 38.5, "no2": 19.2, "so2": 6.7, "co": 0.9, "aqi": 83},
-                    "wind": {"speed": 3.5, "direction": 40, "vector": {"vx": -2.7, "vy": -2.7}}
-                }
-            ],
-            "total_points": 3
-        }
-        
+        # _fetch_json already caps in-flight upstream requests
+        for fetched in await asyncio.gather(*(_fetch_points(batch) for batch in batches)):
+            for point in fetched:
+                key = (point["lat"], point["lon"])
+                _cell_cache.put(key, point)
+                points[key] = point
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Bounding box API error: {e}")
 
-@app.get("/environment/current")
-async def environment_current():
-    try:
-        air = _get_json(
-            "https://air-quality-api.open-meteo.com/v1/air-quality",
-            params={
-                "latitude": LAT,
-                "longitude": LON,
+    return {
+        "bounding_box": NILUFER_BOUNDING_BOX,
+        "grid": {"rows": rows, "cols": cols},
+        "points": [points[c] for c in coords],
+        "total_points": len(coords),
+    }
+
+# Registry of districts/neighbourhoods served by /environment/locations
+LOCATIONS = load_locations()
+LOCATION_BATCH_SIZE = 50
+LOCATION_MAX_IDS = 500
+
+async def _fetch_location_batch(locs: list) -> tuple[list, list, list]:
+    """Same three upstream calls as _fetch_environment_full, one multi-coordinate request each."""
+    params = _coordinate_params([(loc.lat, loc.lon) for loc in locs])
+    responses = await asyncio.gather(
+        _get_json(
+            AIR_QUALITY_URL,
+            {
+                **params,
                 "current": "pm10,pm2_5,nitrogen_dioxide,sulphur_dioxide,carbon_monoxide",
             },
-            timeout=10,
-        )
-
-        weather = _get_json(
-            "https://api.open-meteo.com/v1/forecast",
-            params={
-                "latitude": LAT,
-                "longitude": LON,
+            15,
+        ),
+        _get_json(
+            AIR_QUALITY_URL,
+            {
+                **params,
+                "hourly": "pm10,pm2_5",
+                "past_days": 7,
+                "forecast_days": 3,
+                "domains": "cams_europe",
+            },
+            20,
+        ),
+        _get_json(
+            FORECAST_URL,
+            {
+                **params,
                 "current": "wind_speed_10m,wind_direction_10m",
+                "hourly": "wind_speed_10m,wind_direction_10m",
+                "past_days": 7,
+                "forecast_days": 3,
             },
-            timeout=10,
-        )
+            20,
+        ),
+    )
+    return tuple(_per_coordinate(data, len(locs)) for data in responses)
 
-        ac = air.get("current") or {}
-        pm25 = _first_present(ac, ["pm2_5"])
-        pm10 = _first_present(ac, ["pm10"])
-        no2 = _first_present(ac, ["nitrogen_dioxide", "no2"])
-        so2 = _first_present(ac, ["sulphur_dioxide", "so2"])
-        co = _first_present(ac, ["carbon_monoxide", "co"])
 
-        wc = weather.get("current") or {}
-        speed = wc.get("wind_speed_10m")
-        direction = wc.get("wind_direction_10m")
-        if speed is None or direction is None:
-            raise HTTPException(status_code=502, detail="Upstream API error: missing weather current fields")
+def _location_payload(loc, i: int, buffers: dict) -> dict:
+    """environment_full-style response for row i of the shared buffers."""
+    current = {name: None if np.isnan(values[i]) else float(values[i]) for name, values in buffers["current"].items()}
+    wind = None
+    if current["wind_speed"] is not None and current["wind_direction"] is not None:
+        wind = {
+            "speed": current["wind_speed"],
+            "direction": int(current["wind_direction"]),
+            "vector": {"vx": current["wind_vx"], "vy": current["wind_vy"]},
+        }
+    return {
+        "location": loc.block(),
+        "current": {
+            "timestamp": buffers["timestamp"][i],
+            "air_quality": {
+                **{name: current[name] for name in CURRENT_AIR_KEYS},
+                "aqi": None if current["aqi"] is None else int(current["aqi"]),
+            },
+            "wind": wind,
+        },
+        "hourly": {
+            "time": buffers["time"],
+            **{name: to_list(values[i]) for name, values in buffers["hourly"].items()},
+        },
+    }
+
+
+@app.get("/locations")
+async def locations():
+    """Registered locations (NILUFER_LOCATIONS_FILE or the built-in list)."""
+    return {"locations": [loc.block() for loc in LOCATIONS.values()], "total": len(LOCATIONS)}
+
+
+@app.get("/environment/locations")
+async def environment_locations(
+    ids: str | None = Query(None, description="Comma-separated location ids; all registered locations when omitted"),
+    layout: str = Query("nested", pattern="^(nested|columnar)$"),
+):
+    """environment_full for many locations at once.
+    Locations are fetched in batches of LOCATION_BATCH_SIZE with one multi-coordinate
+    request per upstream call, decoded into shared columnar buffers and then sliced per location.
+    layout=columnar returns the buffers themselves: one row per location in `locations` order.
+    """
+    wanted = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip())) if ids else list(LOCATIONS)
+    unknown = [i for i in wanted if i not in LOCATIONS]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown location id(s): {', '.join(unknown)}")
+    if not wanted:
+        raise HTTPException(status_code=400, detail="No locations requested")
+    if len(wanted) > LOCATION_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {LOCATION_MAX_IDS} locations per request")
+    locs = [LOCATIONS[i] for i in wanted]
+    # Batches are formed from the sorted ids so any subset or order maps to the same upstream cache keys
+    fetch_order = sorted(wanted)
+    batches = [
+        [LOCATIONS[i] for i in fetch_order[k:k + LOCATION_BATCH_SIZE]]
+        for k in range(0, len(fetch_order), LOCATION_BATCH_SIZE)
+    ]
+    try:
+        fetched = await asyncio.gather(*(_fetch_location_batch(batch) for batch in batches))
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Upstream request failed: {e}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Upstream API error: {e}")
+    row = {loc_id: n for n, loc_id in enumerate(fetch_order)}
+    air_current, air_hourly, weather = (
+        [responses[row[loc_id]] for loc_id in wanted]
+        for responses in ([r for batch in fetched for r in batch[k]] for k in range(3))
+    )
+    buffers = await run_in_threadpool(location_buffers, air_current, air_hourly, weather)
+
+    if layout == "columnar":
+        return {
+            "locations": [loc.block() for loc in locs],
+            "timestamp": buffers["timestamp"],
+            "current": {name: to_list(values) for name, values in buffers["current"].items()},
+            "time": buffers["time"],
+            "hourly": {name: [to_list(row) for row in values] for name, values in buffers["hourly"].items()},
+        }
+    return {
+        "locations": [_location_payload(loc, i, buffers) for i, loc in enumerate(locs)],
+        "total": len(locs),
+        "upstream_batches": len(batches),
+    }
+
+
+INTERPOLATED_FIELDS = ("pm2_5", "pm10", "no2", "so2", "co")
+
+_index_cache = IndexCache()
 
-    vector = _wind_vector(speed=float(speed), direction=float(direction))
+
+@app.post("/interpolate")
+async def interpolate(req: InterpolateRequest):
+    """Pollutant estimates at arbitrary locations (schools, hospitals, user positions).
+    Interpolates from the given points, or from the bounding-box grid when none are given.
+    The KD-tree is reused while the point coordinates are unchanged; a pollutant missing
+    at a point is interpolated from the points that report it, and is null when none do.
+    """
+    if len(req.lat) != len(req.lon):
+        raise HTTPException(status_code=400, detail="lat and lon must have the same length")
+    if req.points is not None:
+        points = [p.model_dump() for p in req.points]
+        source = "request"
+    else:
+        grid = await environment_bounding_box(rows=req.rows, cols=req.cols)
+        points = [{"lat": p["lat"], "lon": p["lon"], **p["air_quality"]} for p in grid["points"]]
+        source = "bounding-box"
+
+    def run():
+        values = {
+            name: np.array([np.nan if p[name] is None else p[name] for p in points], dtype=np.float64)
+            for name in INTERPOLATED_FIELDS
+        }
+        index = _index_cache.get(np.array([p["lat"] for p in points]), np.array([p["lon"] for p in points]))
+        lat = np.asarray(req.lat, dtype=np.float64)
+        lon = np.asarray(req.lon, dtype=np.float64)
+        if req.method == "kriging":
+            return index, index.kriging(lat, lon, values, k=req.k, length_scale_m=req.length_scale_m)
+        return index, index.idw(lat, lon, values, k=req.k, power=req.power)
+
+    try:
+        index, estimate = await run_in_threadpool(run)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
     return {
-        "location": {
-            "city": "Bursa",
-            "district": "Nilüfer",
-            "lat": LAT,
-            "lon": LON,
-        },
+        "method": req.method,
+        "source": source,
+        "source_points": index.size,
+        "count": len(req.lat),
+        "lat": req.lat,
+        "lon": req.lon,
+        **{name: to_list(np.round(values, 3)) for name, values in estimate.items()},
+    }
+
+
+@app.get("/environment/current")
+async def environment_current():
+    full = await environment_full()
+    current = full["current"]
+    vector = current["wind"]["vector"]
+
+    return {
+        "location": full["location"],
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "air_quality": {
-            "pm2_5": None if pm25 is None else float(pm25),
-            "pm10": None if pm10 is None else float(pm10),
-            "no2": None if no2 is None else float(no2),
-            "so2": None if so2 is None else float(so2),
-            "co": None if co is None else float(co),
-            "aqi": _pm25_to_aqi(float(pm25)) if pm25 is not None else None,
-        },
-        "wind": {
-            "speed": float(speed),
-            "direction": int(direction),
-            "vector": vector,
-        },
+        "air_quality": current["air_quality"],
+        "wind": current["wind"],
         "spread": {
             "lat": round(LAT + vector["vy"] * SCALE, 3),
             "lon": round(LON + vector["vx"] * SCALE, 3),
         },
+        "snapshot": full["snapshot"],
     }
 
-@app.post("/simulate")
-async def simulate(req: SimulateRequest):
-    data = simulate_dispersion(
+SIMULATE_FORMATS = ("points", "columnar", "binary")
+
+
+def _simulate_format(request: Request, fmt: str | None) -> str:
+    if fmt is not None:
+        if fmt not in SIMULATE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}', expected one of {SIMULATE_FORMATS}")
+        return fmt
+    accept = request.headers.get("accept", "")
+    if "application/octet-stream" in accept:
+        return "binary"
+    if "application/vnd.nilufer.columnar+json" in accept:
+        return "columnar"
+    return "points"
+
+
+def _source_arrays(req: SimulateRequest) -> SourceArrays:
+    return SourceArrays(
+        lat=np.array([src.lat for src in req.sources], dtype=np.float64),
+        lng=np.array([src.lng for src in req.sources], dtype=np.float64),
+        base=np.array(
+            [[src.base_pm25, src.base_pm10, src.base_no2, src.base_so2, src.base_co] for src in req.sources],
+            dtype=np.float64,
+        ).reshape(-1, 5),
+    )
+
+
+# Single-source /simulate answers come from precomputed unit kernels at this wind
+# resolution; set SIMULATE_SPEED_BIN=0 to always run the exact model
+SIMULATE_SPEED_BIN = float(os.environ.get("SIMULATE_SPEED_BIN", 0.5))
+SIMULATE_DIR_BIN = float(os.environ.get("SIMULATE_DIR_BIN", 5.0))
+KERNEL_WARM_MAX_SPEED = 30.0
+KERNEL_CACHE_MAX_BYTES = int(os.environ.get("KERNEL_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+_kernels = KernelTable(SIMULATE_SPEED_BIN, SIMULATE_DIR_BIN, KERNEL_CACHE_MAX_BYTES) if SIMULATE_SPEED_BIN > 0 and SIMULATE_DIR_BIN > 0 else None
+
+
+@app.on_event("startup")
+async def _warm_kernels():
+    # Default mesh of SimulateRequest for every bin; other shapes are filled lazily
+    if _kernels is not None:
+        await run_in_threadpool(_kernels.warm, KERNEL_WARM_MAX_SPEED)
+
+
+# multi_source_mesh evaluates every source against the rays of all sources, so its cost is
+# sources x total mesh points; this keeps the worst case around a second
+MULTI_SOURCE_MAX_WORK = 25_000_000
+
+
+def _check_multi_source_work(req: SimulateRequest) -> None:
+    if req.sources is None:
+        return
+    points = len(req.sources) * mesh_size(req.num_rays, req.max_distance_m, req.step_m)
+    if len(req.sources) * points > MULTI_SOURCE_MAX_WORK:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{len(req.sources)} sources x {points} mesh points exceeds {MULTI_SOURCE_MAX_WORK}; "
+                   "use fewer sources or a coarser mesh (num_rays, max_distance_m, step_m), or /raster",
+        )
+
+
+def _record_simulate(mode: str, start: float, mesh: dict) -> None:
+    SIMULATE_SECONDS.labels(mode).observe(time.perf_counter() - start)
+    SIMULATE_POINTS.labels(mode).observe(mesh["lat"].size)
+
+
+def _simulate_mesh(req: SimulateRequest) -> tuple[dict, dict]:
+    start = time.perf_counter()
+    meta = dispersion_meta(req.wind_speed, req.wind_dir_deg)
+    if req.sources is not None:
+        meta["sources"] = len(req.sources)
+        mesh = multi_source_mesh(
+            _source_arrays(req),
+            wind_speed=req.wind_speed,
+            wind_dir_deg=req.wind_dir_deg,
+            num_rays=req.num_rays,
+            max_distance_m=req.max_distance_m,
+            step_m=req.step_m,
+        )
+        _record_simulate("multi_source", start, mesh)
+        return mesh, meta
+    if _kernels is not None:
+        meta["kernel"] = dict(zip(("wind_speed", "wind_dir_deg"), _kernels.bin(req.wind_speed, req.wind_dir_deg)))
+        mesh = _kernels.mesh(
+            req.wind_speed,
+            req.wind_dir_deg,
+            {
+                "pm25": req.base_pm25,
+                "pm10": req.base_pm10,
+                "no2": req.base_no2,
+                "so2": req.base_so2,
+                "co": req.base_co,
+            },
+            num_rays=req.num_rays,
+            max_distance_m=req.max_distance_m,
+            step_m=req.step_m,
+        )
+        _record_simulate("kernel", start, mesh)
+        return mesh, meta
+    mesh = dispersion_mesh(
         wind_speed=req.wind_speed,
         wind_dir_deg=req.wind_dir_deg,
         base_pm25=req.base_pm25,
@@ -343,288 +965,354 @@ async def simulate(req: SimulateRequest):
         max_distance_m=req.max_distance_m,
         step_m=req.step_m,
     )
-    return data
+    _record_simulate("exact", start, mesh)
+    return mesh, meta
+
+
+# Results are cached as encoded bodies; bump SIMULATE_MODEL_VERSION when the model output changes
+SIMULATE_CACHE_MAX_BYTES = int(os.environ.get("SIMULATE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SIMULATE_MODEL_VERSION = 1
+
+_simulate_cache = LRUBytesCache(SIMULATE_CACHE_MAX_BYTES, shared=_shared_cache)
+
+
+def _quantize_simulate(req: SimulateRequest) -> SimulateRequest:
+    """Round inputs so near-identical dashboard polls share one cache entry."""
+    return req.model_copy(update={
+        "wind_speed": round(req.wind_speed, 2),
+        "wind_dir_deg": round(req.wind_dir_deg, 1),
+        "base_pm25": round(req.base_pm25, 2),
+        "base_pm10": round(req.base_pm10, 2),
+        "base_no2": round(req.base_no2, 2),
+        "base_so2": round(req.base_so2, 2),
+        "base_co": round(req.base_co, 3),
+    })
+
+
+def _encode_json(content) -> bytes:
+    # Same encoding as fastapi's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _render_simulate(req: SimulateRequest, fmt: str) -> tuple[bytes, str]:
+    mesh, meta = _simulate_mesh(req)
+    if fmt == "points":
+        return _encode_json(mesh_to_points(mesh, req.wind_speed, req.wind_dir_deg, meta)), "application/json"
+    if fmt == "columnar":
+        return _encode_json(mesh_to_columns(mesh, req.wind_speed, req.wind_dir_deg, meta)), "application/json"
+    return mesh_to_bytes(mesh, req.wind_speed, req.wind_dir_deg), "application/octet-stream"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@app.post("/simulate")
+async def simulate(req: SimulateRequest, request: Request, format: str | None = None):
+    """Dispersion points. `format` (or the Accept header) selects the payload:
+    points (default list of dicts), columnar (struct-of-arrays JSON) or
+    binary (little-endian float32 columns, see dispersion.MESH_FIELDS).
+    With `sources`, points are the rays of every source carrying the summed concentration;
+    sources x total points is capped at MULTI_SOURCE_MAX_WORK (422 above it).
+    Responses carry a strong ETag (per format, with Vary: Accept); a matching If-None-Match
+    gets 304 without recomputing.
+    """
+    fmt = _simulate_format(request, format)
+    _check_multi_source_work(req)
+    req = _quantize_simulate(req)
+    key = f"{SIMULATE_MODEL_VERSION}:{fmt}:{req.model_dump_json()}"
+    etag = '"' + hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + '"'
+    # Without ?format the body depends on Accept; caches must key on it, 304s included
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if _etag_matches(request, etag):
+        _simulate_cache.stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    cached = _simulate_cache.get(key)
+    if cached is None:
+        cached = await run_in_threadpool(_render_simulate, req, fmt)
+        _simulate_cache.put(key, *cached)
+    body, media_type = cached
+    return Response(content=body, media_type=media_type, headers=headers)
 
 @app.get("/simulate")
-async def simulate_get():
+async def simulate_get(request: Request, format: str | None = None):
     req = SimulateRequest()
-    return await simulate(req)
-
-
-def _ensure_csv_directory():
-    """Create csv_data directory if it doesn't exist"""
-    csv_dir = Path("csv_data")
-    csv_dir.mkdir(exist_ok=True)
-    return csv_dir
-
-
-def _save_current_data_to_csv(data: dict, filename: str = None):
-    """Save current environment data to CSV"""
-    if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"environment_current_{timestamp}.csv"
-    
-    csv_dir = _ensure_csv_directory()
-    filepath = csv_dir / filename
-    
-    # Extract relevant data
-    csv_data = {
-        "timestamp": [data.get("timestamp")],
-        "city": [data["location"]["city"]],
-        "district": [data["location"]["district"]],
-        "latitude": [data["location"]["lat"]],
-        "longitude": [data["location"]["lon"]],
-        "pm2_5": [data["air_quality"]["pm2_5"]],
-        "pm10": [data["air_quality"]["pm10"]],
-        "no2": [data["air_quality"]["no2"]],
-        "so2": [data["air_quality"]["so2"]],
-        "co": [data["air_quality"]["co"]],
-        "aqi": [data["air_quality"]["aqi"]],
-        "wind_speed": [data["wind"]["speed"]],
-        "wind_direction": [data["wind"]["direction"]],
-        "wind_vx": [data["wind"]["vector"]["vx"]],
-        "wind_vy": [data["wind"]["vector"]["vy"]],
-    }
-    
-    df = pd.DataFrame(csv_data)
-    df.to_csv(filepath, index=False, encoding='utf-8-sig')
-    return str(filepath)
-
-
-def _save_hourly_data_to_csv(data: dict, filename: str = None):
-    """Save hourly environment data to CSV"""
-    if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"environment_hourly_{timestamp}.csv"
-    
-    csv_dir = _ensure_csv_directory()
-    filepath = csv_dir / filename
-    
-    # Extract hourly data
-    hourly_data = data["hourly"]
-    csv_data = {
-        "time": hourly_data["time"],
-        "pm2_5": hourly_data["pm2_5"],
-        "pm10": hourly_data["pm10"],
-        "wind_speed": hourly_data["wind_speed"],
-        "wind_direction": hourly_data["wind_direction"],
-        "city": [data["location"]["city"]] * len(hourly_data["time"]),
-        "district": [data["location"]["district"]] * len(hourly_data["time"]),
-        "latitude": [data["location"]["lat"]] * len(hourly_data["time"]),
-        "longitude": [data["location"]["lon"]] * len(hourly_data["time"]),
-    }
-    
-    df = pd.DataFrame(csv_data)
-    df.to_csv(filepath, index=False, encoding='utf-8-sig')
-    return str(filepath)
-
-
-def _save_comprehensive_data_to_csv(data: dict, filename: str = None):
-    """Save all environment data (current + hourly) to a single CSV"""
-    if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"environment_comprehensive_{timestamp}.csv"
-    
-    csv_dir = _ensure_csv_directory()
-    filepath = csv_dir / filename
-    
-    # Prepare comprehensive data
-    comprehensive_rows = []
-    
-    # Add current data as first row
-    current_row = {
-        "data_type": "current",
-        "timestamp": data["current"]["timestamp"],
-        "city": data["location"]["city"],
-        "district": data["location"]["district"],
-        "latitude": data["location"]["lat"],
-        "longitude": data["location"]["lon"],
-        "pm2_5": data["current"]["air_quality"]["pm2_5"],
-        "pm10": data["current"]["air_quality"]["pm10"],
-        "no2": data["current"]["air_quality"]["no2"],
-        "so2": data["current"]["air_quality"]["so2"],
-        "co": data["current"]["air_quality"]["co"],
-        "aqi": data["current"]["air_quality"]["aqi"],
-        "wind_speed": data["current"]["wind"]["speed"],
-        "wind_direction": data["current"]["wind"]["direction"],
-        "wind_vx": data["current"]["wind"]["vector"]["vx"],
-        "wind_vy": data["current"]["wind"]["vector"]["vy"],
-    }
-    comprehensive_rows.append(current_row)
-    
-    # Add all hourly data rows
-    hourly_data = data["hourly"]
-    for i in range(len(hourly_data["time"])):
-        hourly_row = {
-            "data_type": "hourly",
-            "timestamp": hourly_data["time"][i],
-            "city": data["location"]["city"],
-            "district": data["location"]["district"],
-            "latitude": data["location"]["lat"],
-            "longitude": data["location"]["lon"],
-            "pm2_5": hourly_data["pm2_5"][i],
-            "pm10": hourly_data["pm10"][i],
-            "no2": None,  # Hourly data doesn't include these
-            "so2": None,
-            "co": None,
-            "aqi": _pm25_to_aqi(hourly_data["pm2_5"][i]) if hourly_data["pm2_5"][i] is not None else None,
-            "wind_speed": hourly_data["wind_speed"][i],
-            "wind_direction": hourly_data["wind_direction"][i],
-            "wind_vx": None,  # Calculate from speed/direction
-            "wind_vy": None,
-        }
-        
-        # Calculate wind vector for hourly data
-        if hourly_data["wind_speed"][i] is not None and hourly_data["wind_direction"][i] is not None:
-            vector = _wind_vector(speed=float(hourly_data["wind_speed"][i]), direction=float(hourly_data["wind_direction"][i]))
-            hourly_row["wind_vx"] = vector["vx"]
-            hourly_row["wind_vy"] = vector["vy"]
-        
-        comprehensive_rows.append(hourly_row)
-    
-    df = pd.DataFrame(comprehensive_rows)
-    df.to_csv(filepath, index=False, encoding='utf-8-sig')
-    return str(filepath)
-
-
-def _save_comprehensive_data_to_excel(data: dict, filename: str = None):
-    """Save all environment data (current + hourly) to a single Excel file with Turkish headers"""
-    if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"environment_comprehensive_{timestamp}.xlsx"
-    
-    excel_dir = _ensure_csv_directory()
-    filepath = excel_dir / filename
-    
-    # Turkish column headers
-    turkish_headers = {
-        "data_type": "Veri Tipi",
-        "timestamp": "Zaman Damgası",
-        "city": "Şehir",
-        "district": "İlçe",
-        "latitude": "Enlem",
-        "longitude": "Boylam",
-        "pm2_5": "PM2.5 (µg/m³)",
-        "pm10": "PM10 (µg/m³)",
-        "no2": "NO2 (µg/m³)",
-        "so2": "SO2 (µg/m³)",
-        "co": "CO (µg/m³)",
-        "aqi": "Hava Kalitesi İndeksi",
-        "wind_speed": "Rüzgar Hızı (m/s)",
-        "wind_direction": "Rüzgar Yönü (°)",
-        "wind_vx": "Rüzgar Vektörü X",
-        "wind_vy": "Rüzgar Vektörü Y"
-    }
-    
-    # Prepare comprehensive data
-    comprehensive_rows = []
-    
-    # Add current data as first row
-    current_row = {
-        "data_type": "Mevcut",
-        "timestamp": data["current"]["timestamp"],
-        "city": data["location"]["city"],
-        "district": data["location"]["district"],
-        "latitude": data["location"]["lat"],
-        "longitude": data["location"]["lon"],
-        "pm2_5": data["current"]["air_quality"]["pm2_5"],
-        "pm10": data["current"]["air_quality"]["pm10"],
-        "no2": data["current"]["air_quality"]["no2"],
-        "so2": data["current"]["air_quality"]["so2"],
-        "co": data["current"]["air_quality"]["co"],
-        "aqi": data["current"]["air_quality"]["aqi"],
-        "wind_speed": data["current"]["wind"]["speed"],
-        "wind_direction": data["current"]["wind"]["direction"],
-        "wind_vx": data["current"]["wind"]["vector"]["vx"],
-        "wind_vy": data["current"]["wind"]["vector"]["vy"],
+    return await simulate(req, request, format)
+
+
+# Frames computed per vectorized step of /simulate/batch; smaller means earlier first bytes
+BATCH_CHUNK_HOURS = 12
+
+
+def _nan_array(values: list) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _hourly_inputs(env: dict, start_time: str | None, end_time: str | None) -> tuple[list[int], np.ndarray, np.ndarray, np.ndarray]:
+    """Model inputs for the hours of env in start_time..end_time (inclusive, None is open-ended):
+    selected hour indexes, wind speed and direction (T,) and base (T, len(POLLUTANTS)), NaN where missing.
+    Hourly PM comes from the series; NO2, SO2 and CO are held at their current values.
+    """
+    hourly = env["hourly"]
+    selected = [
+        i for i, t in enumerate(hourly["time"])
+        if (start_time is None or t >= start_time) and (end_time is None or t <= end_time)
+    ]
+    aq = env["current"]["air_quality"]
+    wind_speed = _nan_array(hourly["wind_speed"])[selected]
+    wind_dir = _nan_array(hourly["wind_direction"])[selected]
+    base = np.column_stack([
+        _nan_array(hourly["pm2_5"])[selected],
+        _nan_array(hourly["pm10"])[selected],
+        np.full(len(selected), aq["no2"] if aq["no2"] is not None else np.nan),
+        np.full(len(selected), aq["so2"] if aq["so2"] is not None else np.nan),
+        np.full(len(selected), aq["co"] if aq["co"] is not None else np.nan),
+    ])
+    return selected, wind_speed, wind_dir, base
+
+
+@app.post("/simulate/batch")
+async def simulate_batch(req: BatchSimulateRequest):
+    """Dispersion for every hour of /environment/full (or a start_time..end_time range), streamed as NDJSON.
+    The first line is a header, then one frame per hour. Hourly PM comes from the series; NO2, SO2 and CO
+    are held at their current values since the hourly feed does not include them.
+    """
+    env = await environment_full()
+    times = env["hourly"]["time"]
+    selected, wind_speed, wind_dir, base = _hourly_inputs(env, req.start_time, req.end_time)
+    valid = np.isfinite(wind_speed) & np.isfinite(wind_dir) & np.isfinite(base[:, :2]).all(axis=1)
+    base = np.nan_to_num(base)
+    to_payload = mesh_to_columns if req.format == "columnar" else mesh_to_points
+
+    def chunk(lo: int, hi: int) -> str:
+        # Mesh, formatting and encoding of one chunk of frames, run in the threadpool
+        rows = [k for k in range(lo, hi) if valid[k]]
+        series = None
+        if rows:
+            start = time.perf_counter()
+            series = dispersion_mesh_series(
+                wind_speed[rows], wind_dir[rows], base[rows], req.num_rays, req.max_distance_m, req.step_m,
+            )
+            _record_simulate("batch", start, series)
+        lines = []
+        for k in range(lo, hi):
+            frame = {"type": "frame", "index": selected[k], "time": times[selected[k]]}
+            if not valid[k]:
+                frame["skipped"] = True
+            else:
+                t = rows.index(k)
+                frame.update(to_payload(mesh_frame(series, t), float(wind_speed[k]), float(wind_dir[k])))
+            lines.append(json.dumps(frame) + "\n")
+        return "".join(lines)
+
+    async def frames():
+        yield json.dumps({
+            "type": "header",
+            "location": env["location"],
+            "frames": len(selected),
+            "format": req.format,
+        }) + "\n"
+        for lo in range(0, len(selected), BATCH_CHUNK_HOURS):
+            yield await run_in_threadpool(chunk, lo, min(lo + BATCH_CHUNK_HOURS, len(selected)))
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+# Encoded frame sequences, keyed by snapshot time so they live until the next upstream refresh
+FRAMES_CACHE_MAX_BYTES = 32 * 1024 * 1024
+FRAMES_MAGIC = b"NDAF"
+# Grid cells x hours x fields per sequence: 20 MB of uint8 planes, and the float32
+# working set of either model stays within a few times that
+FRAMES_MAX_VALUES = 20_000_000
+
+_frames_cache = LRUBytesCache(FRAMES_CACHE_MAX_BYTES)
+
+
+def _render_frames(req: FrameSequenceRequest, env: dict) -> bytes:
+    times = env["hourly"]["time"]
+    selected, wind_speed, wind_dir, base = _hourly_inputs(env, req.start_time, req.end_time)
+    base = np.nan_to_num(base)
+    valid = np.isfinite(wind_speed) & np.isfinite(wind_dir)
+
+    columns = [POLLUTANTS.index(name) for name in req.fields]
+    start = time.perf_counter()
+    if req.model == "puff":
+        # (T, fields, H, W); missing wind hours keep the previous wind inside the model
+        fields = puff_frames(
+            wind_speed, wind_dir, base[:, columns], NILUFER_BOUNDING_BOX, req.width, req.height,
+            particles_per_hour=req.particles_per_hour, step_s=req.step_s,
+        )
+        quantized = [quantize_frames(fields[:, i], req.dtype, req.encoding == "delta") for i in range(len(columns))]
+    else:
+        # Shared geometry: one grid for every frame; frames only carry values
+        lats, lngs = grid_axes(NILUFER_BOUNDING_BOX, req.width, req.height)
+        weights = np.zeros((len(selected), req.height, req.width), dtype=np.float32)
+        for t in np.flatnonzero(valid):
+            weights[t] = plume_weight(
+                float(wind_speed[t]), float(wind_dir[t]), lats[:, None], lngs[None, :], req.max_distance_m,
+            )
+        # Each field is the unit weights scaled per hour; quantized without building the products
+        quantized = [quantize_frames(weights, req.dtype, req.encoding == "delta", factors=base[:, k]) for k in columns]
+    SIMULATE_SECONDS.labels(f"frames_{req.model}").observe(time.perf_counter() - start)
+
+    planes = [q for q, _ in quantized]
+    scales = {name: scale for name, (_, scale) in zip(req.fields, quantized)}
+
+    header = json.dumps({
+        "bounding_box": NILUFER_BOUNDING_BOX,
+        "width": req.width,
+        "height": req.height,
+        "times": [times[i] for i in selected],
+        "wind_speed": [None if not valid[t] else float(wind_speed[t]) for t in range(len(selected))],
+        "wind_direction": [None if not valid[t] else float(wind_dir[t]) for t in range(len(selected))],
+        "fields": req.fields,
+        "scale": scales,
+        "dtype": req.dtype,
+        "encoding": req.encoding,
+        "model": req.model,
+        "units": "base concentration" if req.model == "plume" else "base concentration x release-hours per km2",
+        "layout": "field, frame, row (north to south), column",
+        "snapshot": env["snapshot"],
+    }).encode("utf-8")
+    header += b" " * (-(len(header) + 8) % 4)  # align the planes for typed-array views
+    return FRAMES_MAGIC + len(header).to_bytes(4, "little") + header + b"".join(
+        plane.astype(plane.dtype.newbyteorder("<")).tobytes() for plane in planes
+    )
+
+
+@app.post("/simulate/frames")
+async def simulate_frames(req: FrameSequenceRequest, request: Request):
+    """Animation frames for a time range in one payload: a JSON header (grid, times, scales)
+    followed by quantized per-frame rasters over NILUFER_BOUNDING_BOX, optionally delta-encoded.
+    model=puff advects puffs released every step_s through the hourly winds (see puff.puff_frames)
+    instead of drawing an independent static plume per hour.
+    Body layout: 4s magic, u32 header length, header JSON, then the planes.
+    """
+    unknown = [name for name in req.fields if name not in POLLUTANTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}, expected any of {POLLUTANTS}")
+    env = await environment_full()
+    hours = sum(
+        1 for t in env["hourly"]["time"]
+        if (req.start_time is None or t >= req.start_time) and (req.end_time is None or t <= req.end_time)
+    )
+    values = req.width * req.height * hours * len(req.fields)
+    if values > FRAMES_MAX_VALUES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"width x height x hours x fields = {values} exceeds {FRAMES_MAX_VALUES}; "
+                   "narrow the time range or use a smaller grid or fewer fields",
+        )
+    key = f"{env['snapshot']['fetched_at']}:{req.model_dump_json()}"
+    cached = _frames_cache.get(key)
+    if cached is None:
+        body = await run_in_threadpool(_render_frames, req, env)
+        compressed = await run_in_threadpool(gzip.compress, body, 6)
+        _frames_cache.put(key, compressed, "application/octet-stream")
+    else:
+        compressed = cached[0]
+    # Body depends on Accept-Encoding; shared caches must key on it
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=compressed,
+            media_type="application/octet-stream",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return Response(
+        content=gzip.decompress(compressed), media_type="application/octet-stream", headers={"Vary": "Accept-Encoding"},
+    )
+
+
+# Largest raster side; a 2048 x 2048 grid is five 16 MB float32 planes
+RASTER_MAX_SIZE = 2048
+
+
+def _render_raster(req: SimulateRequest, width: int, height: int, format: str) -> tuple[bytes, str]:
+    if req.sources is not None:
+        planes = superpose_grid(
+            NILUFER_BOUNDING_BOX,
+            width,
+            height,
+            wind_speed=req.wind_speed,
+            wind_dir_deg=req.wind_dir_deg,
+            sources=_source_arrays(req),
+            max_distance_m=req.max_distance_m,
+        )
+    else:
+        planes = concentration_raster(
+            NILUFER_BOUNDING_BOX,
+            width,
+            height,
+            wind_speed=req.wind_speed,
+            wind_dir_deg=req.wind_dir_deg,
+            base={
+                "pm25": req.base_pm25,
+                "pm10": req.base_pm10,
+                "no2": req.base_no2,
+                "so2": req.base_so2,
+                "co": req.base_co,
+            },
+            max_distance_m=req.max_distance_m,
+        )
+    if format == "png":
+        return pm25_to_png(planes["pm25"]), "image/png"
+    return raster_to_bytes(planes, NILUFER_BOUNDING_BOX), "application/octet-stream"
+
+
+@app.post("/raster")
+async def raster(
+    req: SimulateRequest,
+    width: int = Query(256, ge=1, le=RASTER_MAX_SIZE),
+    height: int = Query(256, ge=1, le=RASTER_MAX_SIZE),
+    format: str = "binary",
+):
+    """Plume concentration on a regular grid over NILUFER_BOUNDING_BOX.
+    binary: float32 plane per pollutant (see dispersion.RASTER_FIELDS), png: PM2.5 colored by color_scale bands.
+    """
+    if format not in ("binary", "png"):
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected binary or png")
+    body, media_type = await run_in_threadpool(_render_raster, req, width, height, format)
+    return Response(content=body, media_type=media_type)
+
+@app.get("/raster")
+async def raster_get(
+    width: int = Query(256, ge=1, le=RASTER_MAX_SIZE),
+    height: int = Query(256, ge=1, le=RASTER_MAX_SIZE),
+    format: str = "binary",
+):
+    return await raster(SimulateRequest(), width, height, format)
+
+
+async def _export_module():
+    """app.export (pandas, and openpyxl on demand), imported off the event loop on first use."""
+    return await run_in_threadpool(importlib.import_module, ".export", __package__)
+
+
+def _current_export(env: dict) -> dict:
+    """Input of export.save_current_data_to_csv: the snapshot's current reading, stamped with its own time."""
+    return {
+        "timestamp": env["current"]["timestamp"],
+        "location": env["location"],
+        "air_quality": env["current"]["air_quality"],
+        "wind": env["current"]["wind"],
     }
-    comprehensive_rows.append(current_row)
-    
-    # Add all hourly data rows
-    hourly_data = data["hourly"]
-    print(f"DEBUG: Hourly data length - time: {len(hourly_data.get('time', []))}, pm2_5: {len(hourly_data.get('pm2_5', []))}")
-    
-    for i in range(len(hourly_data.get("time", []))):
-        hourly_row = {
-            "data_type": "Saatlik",
-            "timestamp": hourly_data["time"][i],
-            "city": data["location"]["city"],
-            "district": data["location"]["district"],
-            "latitude": data["location"]["lat"],
-            "longitude": data["location"]["lon"],
-            "pm2_5": hourly_data["pm2_5"][i],
-            "pm10": hourly_data["pm10"][i],
-            "no2": None,  # Hourly data doesn't include these
-            "so2": None,
-            "co": None,
-            "aqi": _pm25_to_aqi(hourly_data["pm2_5"][i]) if hourly_data["pm2_5"][i] is not None else None,
-            "wind_speed": hourly_data["wind_speed"][i],
-            "wind_direction": hourly_data["wind_direction"][i],
-            "wind_vx": None,  # Calculate from speed/direction
-            "wind_vy": None,
-        }
-        
-        # Calculate wind vector for hourly data
-        if hourly_data["wind_speed"][i] is not None and hourly_data["wind_direction"][i] is not None:
-            vector = _wind_vector(speed=float(hourly_data["wind_speed"][i]), direction=float(hourly_data["wind_direction"][i]))
-            hourly_row["wind_vx"] = vector["vx"]
-            hourly_row["wind_vy"] = vector["vy"]
-        
-        comprehensive_rows.append(hourly_row)
-    
-    print(f"DEBUG: Total rows prepared: {len(comprehensive_rows)}")
-    
-    # Create DataFrame and rename columns to Turkish
-    df = pd.DataFrame(comprehensive_rows)
-    print(f"DEBUG: DataFrame shape: {df.shape}")
-    print(f"DEBUG: DataFrame columns: {list(df.columns)}")
-    
-    df = df.rename(columns=turkish_headers)
-    
-    # Save to Excel with formatting
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Hava Kalitesi Verileri')
-        
-        # Get the workbook and worksheet for formatting
-        workbook = writer.book
-        worksheet = writer.sheets['Hava Kalitesi Verileri']
-        
-        # Adjust column widths for better readability
-        column_widths = {
-            'A': 12,  # Veri Tipi
-            'B': 20,  # Zaman Damgası
-            'C': 10,  # Şehir
-            'D': 10,  # İlçe
-            'E': 12,  # Enlem
-            'F': 12,  # Boylam
-            'G': 15,  # PM2.5
-            'H': 15,  # PM10
-            'I': 15,  # NO2
-            'J': 15,  # SO2
-            'K': 15,  # CO
-            'L': 20,  # Hava Kalitesi İndeksi
-            'M': 18,  # Rüzgar Hızı
-            'N': 18,  # Rüzgar Yönü
-            'O': 15,  # Rüzgar Vektörü X
-            'P': 15,  # Rüzgar Vektörü Y
-        }
-        
-        for col, width in column_widths.items():
-            worksheet.column_dimensions[col].width = width
-    
-    print(f"DEBUG: Excel file saved to: {filepath}")
-    return str(filepath)
 
 
 @app.get("/export/excel")
-async def export_excel():
+async def export_excel(start: str | None = None, end: str | None = None):
     """Export all environment data to a single comprehensive Excel file with Turkish headers"""
+    export = await _export_module()
     try:
-        # Get full environment data
-        env_data = await environment_full()
+        # Current snapshot plus stored hourly history for the requested range
+        env_data = await _environment_history(start, end)
         
         # Save comprehensive data to Excel with Turkish headers
-        excel_file = _save_comprehensive_data_to_excel(env_data)
+        excel_file = await run_in_threadpool(export.save_comprehensive_data_to_excel, env_data)
         
         return {
             "message": "Excel dosyası başarıyla oluşturuldu",
@@ -636,7 +1324,7 @@ async def export_excel():
                 "total_records": len(env_data["hourly"]["time"]) + 1,
                 "format": "Excel (.xlsx)",
                 "headers": "Türkçe",
-                "sheet_name": "Hava Kalitesi Verileri"
+                "sheet_name": export.EXCEL_SHEET_NAME
             }
         }
         
@@ -645,14 +1333,15 @@ async def export_excel():
 
 
 @app.get("/export/csv")
-async def export_csv():
+async def export_csv(start: str | None = None, end: str | None = None):
     """Export all environment data to a single comprehensive CSV file"""
+    export = await _export_module()
     try:
-        # Get full environment data
-        env_data = await environment_full()
+        # Current snapshot plus stored hourly history for the requested range
+        env_data = await _environment_history(start, end)
         
         # Save comprehensive data to single CSV
-        comprehensive_file = _save_comprehensive_data_to_csv(env_data)
+        comprehensive_file = await run_in_threadpool(export.save_comprehensive_data_to_csv, env_data)
         
         return {
             "message": "Comprehensive CSV file created successfully",
@@ -670,22 +1359,18 @@ async def export_csv():
 
 
 @app.get("/export/csv/separate")
-async def export_csv_separate():
+async def export_csv_separate(start: str | None = None, end: str | None = None):
     """Export current and hourly environment data to separate CSV files"""
+    export = await _export_module()
     try:
-        # Get full environment data
-        env_data = await environment_full()
+        # Current snapshot plus stored hourly history for the requested range
+        env_data = await _environment_history(start, end)
         
         # Save current data
-        current_file = _save_current_data_to_csv({
-            "timestamp": env_data["current"]["timestamp"],
-            "location": env_data["location"],
-            "air_quality": env_data["current"]["air_quality"],
-            "wind": env_data["current"]["wind"],
-        })
+        current_file = await run_in_threadpool(export.save_current_data_to_csv, _current_export(env_data))
         
         # Save hourly data
-        hourly_file = _save_hourly_data_to_csv(env_data)
+        hourly_file = await run_in_threadpool(export.save_hourly_data_to_csv, env_data)
         
         return {
             "message": "Separate CSV files created successfully",
@@ -703,9 +1388,11 @@ async def export_csv_separate():
 @app.get("/export/csv/current")
 async def export_current_csv():
     """Export only current environment data to CSV"""
+    export = await _export_module()
     try:
-        current_data = await environment_current()
-        filepath = _save_current_data_to_csv(current_data)
+        # Named after the reading time, so repeated exports of one snapshot overwrite one file
+        current_data = _current_export(await environment_full())
+        filepath = await run_in_threadpool(export.save_current_data_to_csv, current_data)
         
         return {
             "message": "Current data CSV created successfully",
@@ -715,3 +1402,74 @@ async def export_current_csv():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"CSV export failed: {str(e)}")
+
+
+def _export_range(env: dict, start: str | None, end: str | None) -> tuple[str | None, str | None]:
+    if start is None and end is None and env["hourly"]["time"]:
+        return env["hourly"]["time"][0], env["hourly"]["time"][-1]
+    return start, end
+
+
+def _csv_download(chunks, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/export/csv/download")
+async def export_csv_download(start: str | None = None, end: str | None = None):
+    """Stream the comprehensive CSV (current + stored hourly rows) to the client without writing a file"""
+    export = await _export_module()
+    env = await environment_full()
+    start, end = _export_range(env, start, end)
+    return _csv_download(
+        export.iter_comprehensive_csv(_store, LOCATION_ID, env, start, end),
+        f"environment_comprehensive_{export.range_tag([start or '', end or ''])}.csv",
+    )
+
+
+@app.get("/export/csv/hourly/download")
+async def export_hourly_csv_download(start: str | None = None, end: str | None = None):
+    """Stream the stored hourly series as CSV to the client without writing a file"""
+    export = await _export_module()
+    env = await environment_full()
+    start, end = _export_range(env, start, end)
+    return _csv_download(
+        export.iter_hourly_csv(_store, LOCATION_ID, env, start, end),
+        f"environment_hourly_{export.range_tag([start or '', end or ''])}.csv",
+    )
+
+
+@app.get("/export/excel/download")
+async def export_excel_download(start: str | None = None, end: str | None = None):
+    """Build the Turkish-header workbook for a stored range with constant memory and send it to the client"""
+    export = await _export_module()
+    env = await environment_full()
+    start, end = _export_range(env, start, end)
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await run_in_threadpool(
+            export.write_excel, path, export.iter_comprehensive_frames(_store, LOCATION_ID, env, start, end, "Mevcut", "Saatlik"),
+        )
+    except Exception as e:
+        os.unlink(path)
+        raise HTTPException(status_code=500, detail=f"Excel export failed: {str(e)}")
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"environment_comprehensive_{export.range_tag([start or '', end or ''])}.xlsx",
+        background=BackgroundTask(os.unlink, path),
+    )
+
+
+cache_collector.add("upstream", _upstream_cache.snapshot)
+cache_collector.add("bounding_box_cells", _cell_cache.snapshot)
+cache_collector.add("simulate", _simulate_cache.snapshot)
+cache_collector.add("frames", _frames_cache.snapshot)
+if _kernels is not None:
+    cache_collector.add("simulate_kernels", _kernels.snapshot)
+if _shared_cache is not None:
+    cache_collector.add("shared", _shared_cache.snapshot)
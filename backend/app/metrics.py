@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger("app.spans")
+# NILUFER_SPAN_LOG_LEVEL=WARNING turns the per-span JSON lines off
+SPAN_LOG_LEVEL = os.environ.get("NILUFER_SPAN_LOG_LEVEL", "INFO").upper()
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to first response byte per route",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Open-Meteo request latency", ["url"],
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_request_errors_total", "Failed Open-Meteo requests", ["url", "kind"],
+)
+SIMULATE_SECONDS = Histogram(
+    "simulate_duration_seconds", "Time spent computing dispersion meshes", ["mode"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+SIMULATE_POINTS = Histogram(
+    "simulate_points", "Points per dispersion mesh", ["mode"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+EXPORT_SECONDS = Histogram("export_duration_seconds", "Export build time", ["format"])
+EXPORT_ROWS = Counter("export_rows_total", "Rows written by exports", ["format"])
+SPAN_SECONDS = Histogram("span_duration_seconds", "Duration of instrumented code spans", ["span"])
+# With several workers each reports its own loop; the scrape shows the worst live one
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event-loop scheduling delay", multiprocess_mode="livemax")
+EVENT_LOOP_LAG_HIST = Histogram(
+    "event_loop_lag_distribution_seconds", "Event-loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+@contextmanager
+def span(name: str, **fields):
+    """Time a block, record it in span_duration_seconds and log one JSON line.
+    The yielded dict can be filled with extra fields (row counts etc.) inside the block.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        SPAN_SECONDS.labels(name).observe(duration)
+        record = {"span": name, "duration_ms": round(duration * 1000, 3), **fields}
+        if error is not None:
+            record["error"] = error
+        logger.info(json.dumps(record, default=str))
+
+
+def configure_span_logging() -> None:
+    """Write span lines to stderr as bare JSON. Uvicorn only configures its own loggers, so
+    without this the INFO records of app.spans never reach a handler. A logger that already
+    has handlers (set up by the deployment) is left alone.
+    """
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(SPAN_LOG_LEVEL)
+    logger.propagate = False
+
+
+class CacheCollector:
+    """Exposes the stats dicts of the in-process caches as cache_* metrics at scrape time."""
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def add(self, name: str, snapshot: Callable[[], dict]) -> None:
+        self._sources[name] = snapshot
+
+    def collect(self):
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Served-from-cache share of lookups", labels=["cache"])
+        events = CounterMetricFamily("cache_events", "Cache lookups by outcome", labels=["cache", "kind"])
+        for name, snapshot in self._sources.items():
+            stats = snapshot()
+            if stats is None:
+                continue
+            if stats.get("hit_ratio") is not None:
+                ratio.add_metric([name], stats["hit_ratio"])
+            for kind in ("hits", "stale_hits", "misses", "coalesced", "refreshes", "evictions", "not_modified", "shared_hits", "writes", "waits"):
+                if kind in stats:
+                    events.add_metric([name, kind], stats[kind])
+        yield ratio
+        yield events
+
+
+class LatencyMiddleware:
+    """Plain ASGI middleware feeding REQUEST_LATENCY when the response starts.
+
+    Unlike @app.middleware("http") it does not wrap the response body in an extra task
+    and stream, so long-lived streams such as /events cost nothing past their headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int) -> None:
+            nonlocal observed
+            observed = True
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status),
+            ).observe(time.perf_counter() - start)
+
+        async def send_observed(message):
+            if message["type"] == "http.response.start" and not observed:
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            if not observed:
+                observe(500)
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+def scrape_registry() -> CollectorRegistry:
+    """Registry /metrics serves. With PROMETHEUS_MULTIPROC_DIR set (run.py --prod with several
+    workers) every worker writes its metrics there and a scrape sums them; the cache_* metrics
+    come from in-process caches and stay those of the worker that answers the scrape.
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(cache_collector)
+    return registry
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges from the multiprocess files on shutdown."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+async def monitor_event_loop(interval_s: float = 0.5) -> None:
+    """Measure how late the loop wakes a sleeping task; blocking work shows up as lag."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval_s)
+        lag = max(0.0, loop.time() - start - interval_s)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HIST.observe(lag)
+
+
+@contextmanager
+def export_span(fmt: str, **fields):
+    """span() for exporters; also feeds export_duration_seconds and export_rows_total from fields["rows"]."""
+    start = time.perf_counter()
+    with span(f"export.{fmt}", **fields) as record:
+        try:
+            yield record
+        finally:
+            EXPORT_SECONDS.labels(fmt).observe(time.perf_counter() - start)
+            EXPORT_ROWS.labels(fmt).inc(record.get("rows", 0))
@@ -0,0 +1,145 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from .dispersion import M_PER_DEG_LAT, M_PER_DEG_LON, NILUFER_LAT, NILUFER_LNG
+
+# Same 2 km e-folding with distance travelled as dispersion_mesh's exp(-(d / 1000) / 2)
+DECAY_DISTANCE_M = 2000.0
+# Slow first-order loss so puffs released into calm air do not pile up forever
+LIFETIME_S = 12 * 3600.0
+# Puffs below this share of their release mass, or this far outside the grid, are dropped
+MIN_MASS_FRACTION = 1e-3
+DROP_MARGIN_M = 2000.0
+# Live puffs kept after each hour; above it a random subset carries the dropped mass,
+# so calm air (where nothing leaves the grid) costs the same per step as a breeze
+MAX_LIVE_PUFFS = 50_000
+
+
+def default_diffusivity(wind_speed: np.ndarray) -> np.ndarray:
+    """Horizontal eddy diffusivity (m²/s) growing with wind speed; sets the random-walk step."""
+    return 20.0 + 15.0 * np.asarray(wind_speed, dtype=np.float64)
+
+
+def _wind_components(wind_speed: np.ndarray, wind_dir_deg: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """East/north velocity (m/s) toward wind_dir_deg, the dispersion_mesh convention.
+    Missing hours carry the previous valid wind (calm before the first one).
+    """
+    speed = np.asarray(wind_speed, dtype=np.float64)
+    direction = np.asarray(wind_dir_deg, dtype=np.float64)
+    valid = np.isfinite(speed) & np.isfinite(direction)
+    last = np.maximum.accumulate(np.where(valid, np.arange(speed.size), -1))
+    theta = np.radians(np.where(last >= 0, direction[np.maximum(last, 0)], 0.0))
+    speed = np.where(last >= 0, speed[np.maximum(last, 0)], 0.0)
+    return speed * np.sin(theta), speed * np.cos(theta)
+
+
+def puff_frames(
+    wind_speed: np.ndarray,
+    wind_dir_deg: np.ndarray,
+    emission: np.ndarray,
+    bbox: Dict[str, float],
+    width: int,
+    height: int,
+    src_lat: float = NILUFER_LAT,
+    src_lng: float = NILUFER_LNG,
+    particles_per_hour: int = 2000,
+    step_s: int = 300,
+    diffusivity: Optional[float] = None,
+    seed: int = 0,
+    max_puffs: int = MAX_LIVE_PUFFS,
+) -> np.ndarray:
+    """Lagrangian puff model over an hourly wind series.
+
+    wind_speed/wind_dir_deg are (T,) hourly values; emission is (T, P) source strength per
+    hour for P species. Every step_s, particles_per_hour * step_s / 3600 puffs are released
+    at the source, carrying that hour's emission. All live puffs move with the wind (linearly
+    interpolated between hours) plus a Gaussian random walk of variance 2 K dt, and lose mass
+    with distance travelled and age. At the end of each hour at most max_puffs puffs are kept:
+    a uniform random subset whose mass is scaled up by live / max_puffs, which keeps the
+    expected field unchanged. Returns float32 (T, P, height, width): frame t is the
+    state at the end of hour t, with puff mass binned per km² (one hour of release = unit
+    mass, scaled by emission), so values do not depend on the grid resolution.
+    """
+    emission = np.asarray(emission, dtype=np.float64)
+    emission = np.nan_to_num(emission.reshape(len(emission), -1))
+    hours, species = emission.shape
+    substeps = max(1, round(3600 / step_s))
+    dt = 3600.0 / substeps
+    per_step = max(1, round(particles_per_hour / substeps))
+    rng = np.random.default_rng(seed)
+
+    u, v = _wind_components(wind_speed, wind_dir_deg)
+    # Wind at the middle of each substep, interpolated toward the next hour
+    frac = (np.arange(substeps) + 0.5) / substeps
+    u_next = np.append(u[1:], u[-1:]) if hours else u
+    v_next = np.append(v[1:], v[-1:]) if hours else v
+    step_u = u[:, None] + (u_next - u)[:, None] * frac[None, :]
+    step_v = v[:, None] + (v_next - v)[:, None] * frac[None, :]
+    step_speed = np.hypot(step_u, step_v)
+    if diffusivity is None:
+        sigma = np.sqrt(2.0 * default_diffusivity(step_speed) * dt)
+    else:
+        sigma = np.full_like(step_speed, np.sqrt(2.0 * diffusivity * dt))
+    step_decay = np.exp(-step_speed * dt / DECAY_DISTANCE_M - dt / LIFETIME_S)
+
+    dlat = (bbox["lat_max"] - bbox["lat_min"]) / height
+    dlon = (bbox["lon_max"] - bbox["lon_min"]) / width
+    cell_km2 = (dlat * M_PER_DEG_LAT) * (dlon * M_PER_DEG_LON) / 1e6
+    # Source-relative metres of the grid edges, for dropping puffs that left the area
+    x_min = (bbox["lon_min"] - src_lng) * M_PER_DEG_LON - DROP_MARGIN_M
+    x_max = (bbox["lon_max"] - src_lng) * M_PER_DEG_LON + DROP_MARGIN_M
+    y_min = (bbox["lat_min"] - src_lat) * M_PER_DEG_LAT - DROP_MARGIN_M
+    y_max = (bbox["lat_max"] - src_lat) * M_PER_DEG_LAT + DROP_MARGIN_M
+
+    # Thinning runs hourly, so at most one hour of releases sits on top of max_puffs
+    capacity = min(hours * substeps * per_step, max_puffs + substeps * per_step)
+    x = np.empty(capacity)
+    y = np.empty(capacity)
+    mass = np.empty(capacity)
+    released = np.empty(capacity, dtype=np.int32)  # release hour, indexes emission
+    n = 0
+    release_mass = 1.0 / (substeps * per_step)
+
+    frames = np.zeros((hours, species, height, width), dtype=np.float32)
+    for t in range(hours):
+        for k in range(substeps):
+            su, sv, s = step_u[t, k], step_v[t, k], sigma[t, k]
+            x[:n] += su * dt + s * rng.standard_normal(n)
+            y[:n] += sv * dt + s * rng.standard_normal(n)
+            mass[:n] *= step_decay[t, k]
+
+            # New puffs are released at uniform times within this step, so by its end
+            # each has covered the remaining share of the step's path, spread and decay
+            remaining = 1.0 - rng.random(per_step)
+            spread = s * np.sqrt(remaining)
+            x[n:n + per_step] = su * dt * remaining + spread * rng.standard_normal(per_step)
+            y[n:n + per_step] = sv * dt * remaining + spread * rng.standard_normal(per_step)
+            mass[n:n + per_step] = release_mass * step_decay[t, k] ** remaining
+            released[n:n + per_step] = t
+            n += per_step
+
+        keep = (
+            (mass[:n] >= release_mass * MIN_MASS_FRACTION)
+            & (x[:n] >= x_min) & (x[:n] <= x_max) & (y[:n] >= y_min) & (y[:n] <= y_max)
+        )
+        live = np.flatnonzero(keep)
+        if live.size > max_puffs:
+            scale = live.size / max_puffs
+            live = np.sort(rng.choice(live, max_puffs, replace=False))
+            mass[live] *= scale
+        if live.size < n:
+            for arr in (x, y, mass, released):
+                arr[:live.size] = arr[live]
+            n = live.size
+
+        col = np.floor((src_lng + x[:n] / M_PER_DEG_LON - bbox["lon_min"]) / dlon).astype(np.int64)
+        row = np.floor((bbox["lat_max"] - (src_lat + y[:n] / M_PER_DEG_LAT)) / dlat).astype(np.int64)
+        inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+        cell = row[inside] * width + col[inside]
+        weighted = mass[:n][inside, None] * emission[released[:n][inside]]
+        for p in range(species):
+            frames[t, p] = (
+                np.bincount(cell, weights=weighted[:, p], minlength=width * height).reshape(height, width) / cell_km2
+            )
+    return frames
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator
+
+
+# diff() result when nothing changed; None is a legitimate new value
+UNCHANGED = object()
+
+
+def diff(old: Any, new: Any) -> Any:
+    """Nested dict of the leaves of new that differ from old (including leaves that became None);
+    UNCHANGED when nothing changed. Lists and scalars are compared whole; see removed() for deleted keys.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {}
+        for key, value in new.items():
+            if key not in old:
+                changed[key] = value
+                continue
+            sub = diff(old[key], value)
+            if sub is not UNCHANGED:
+                changed[key] = sub
+        return changed or UNCHANGED
+    return UNCHANGED if old == new else new
+
+
+def removed(old: Any, new: Any, path: tuple = ()) -> list[list]:
+    """Key paths present in old and missing from new, descending only where both sides are dicts."""
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return []
+    paths = [[*path, key] for key in old.keys() - new.keys()]
+    for key in old.keys() & new.keys():
+        paths.extend(removed(old[key], new[key], (*path, key)))
+    return paths
+
+
+class Broadcaster:
+    """Fan-out of server-sent events to every connected client.
+
+    Each message is serialized once and handed to per-connection queues; idle
+    connections just wait on their queue, so there is no per-connection polling.
+    Slow clients drop their oldest pending messages instead of growing memory.
+    """
+
+    def __init__(self, queue_size: int = 8, heartbeat_s: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat_s = heartbeat_s
+        self._queues: set[asyncio.Queue] = set()
+        self._state: Any = None
+        self._event_id = 0
+        self.stats = {"published": 0, "dropped": 0}
+
+    @property
+    def connections(self) -> int:
+        return len(self._queues)
+
+    @staticmethod
+    def _format(event: str, data: Any, event_id: int) -> str:
+        return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    def publish(self, state: Any) -> None:
+        """Send the fields of state that changed since the last publish to every client,
+        as {"changed": nested changed leaves, "removed": key paths to delete}.
+        """
+        if self._state is None:
+            changed, gone = state, []
+        else:
+            changed, gone = diff(self._state, state), removed(self._state, state)
+        self._state = state
+        if changed is UNCHANGED and not gone:
+            return
+        self._event_id += 1
+        message = self._format("update", {"changed": {} if changed is UNCHANGED else changed, "removed": gone}, self._event_id)
+        self.stats["published"] += 1
+        for queue in self._queues:
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(message)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """SSE body for one client: the full current state, then changes as they are published."""
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._queues.add(queue)
+        try:
+            yield "retry: 5000\n"
+            if self._state is not None:
+                yield self._format("snapshot", self._state, self._event_id)
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=self.heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self._queues.discard(queue)
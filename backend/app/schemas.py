@@ -1,5 +1,15 @@
 from pydantic import BaseModel, Field
 
+class EmissionSource(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+    name: str | None = None
+    base_pm25: float = 0.0
+    base_pm10: float = 0.0
+    base_no2: float = 0.0
+    base_so2: float = 0.0
+    base_co: float = 0.0
+
 class SimulateRequest(BaseModel):
     wind_speed: float = Field(3.0, ge=0)
     wind_dir_deg: float = Field(45.0, ge=0, le=360)
@@ -8,9 +18,60 @@ class SimulateRequest(BaseModel):
     base_no2: float = 18.0
     base_so2: float = 6.0
     base_co: float = 0.7
-    num_rays: int = 9
-    max_distance_m: int = 5000
-    step_m: int = 500
+    # Bounded so one mesh stays under ~75k points (a few MB per cached kernel)
+    num_rays: int = Field(9, ge=1, le=181)
+    max_distance_m: int = Field(5000, ge=0, le=20_000)
+    step_m: int = Field(500, ge=50, le=20_000)
+    # When set, these replace the single default source at NILUFER_LAT/NILUFER_LNG
+    sources: list[EmissionSource] | None = Field(None, max_length=2000)
+
+class BatchSimulateRequest(BaseModel):
+    # Inclusive range over /environment/full hourly times, e.g. "2025-12-15T00:00"; None means open-ended
+    start_time: str | None = None
+    end_time: str | None = None
+    # Same mesh bounds as SimulateRequest
+    num_rays: int = Field(9, ge=1, le=181)
+    max_distance_m: int = Field(5000, ge=0, le=20_000)
+    step_m: int = Field(500, ge=50, le=20_000)
+    format: str = Field("columnar", pattern="^(points|columnar)$")
+
+class MeasurementPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    pm2_5: float | None = None
+    pm10: float | None = None
+    no2: float | None = None
+    so2: float | None = None
+    co: float | None = None
+
+class InterpolateRequest(BaseModel):
+    # Query locations as parallel arrays
+    lat: list[float] = Field(..., max_length=100_000)
+    lon: list[float] = Field(..., max_length=100_000)
+    method: str = Field("idw", pattern="^(idw|kriging)$")
+    k: int = Field(8, ge=1, le=64)
+    power: float = Field(2.0, gt=0)
+    length_scale_m: float | None = Field(None, gt=0)
+    # Measurements to interpolate from; defaults to the /environment/bounding-box grid
+    points: list[MeasurementPoint] | None = None
+    rows: int = Field(5, ge=1, le=20)
+    cols: int = Field(5, ge=1, le=20)
+
+class FrameSequenceRequest(BaseModel):
+    # Inclusive range over /environment/full hourly times; None means open-ended
+    start_time: str | None = None
+    end_time: str | None = None
+    width: int = Field(128, ge=8, le=512)
+    height: int = Field(128, ge=8, le=512)
+    fields: list[str] = Field(["pm25"], min_length=1)
+    dtype: str = Field("uint8", pattern="^(uint8|uint16)$")
+    encoding: str = Field("delta", pattern="^(delta|absolute)$")
+    # Same bound as SimulateRequest; width x height x hours x fields is capped per request (FRAMES_MAX_VALUES)
+    max_distance_m: int = Field(5000, ge=0, le=20_000)
+    # plume: static dispersion per hour; puff: Lagrangian puffs advected through the hourly winds
+    model: str = Field("plume", pattern="^(plume|puff)$")
+    particles_per_hour: int = Field(2000, ge=10, le=50000)
+    step_s: int = Field(300, ge=30, le=3600)
 
 class HealthResponse(BaseModel):
     status: str = "ok"
@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator
+
+HOURLY_FIELDS = ("pm2_5", "pm10", "wind_speed", "wind_direction")
+CURRENT_FIELDS = ("pm2_5", "pm10", "no2", "so2", "co", "wind_speed", "wind_direction")
+
+
+class TimeSeriesStore:
+    """Append-only SQLite store of hourly series keyed by (location, time).
+
+    Re-ingesting an overlapping window upserts the existing rows, so repeated
+    fetches of the same 240-hour window do not grow the store. Times are the
+    ISO strings Open-Meteo returns, which sort chronologically.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        if str(path) != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hourly ("
+            "location TEXT NOT NULL, time TEXT NOT NULL, "
+            + ", ".join(f"{f} REAL" for f in HOURLY_FIELDS)
+            + ", PRIMARY KEY (location, time)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS current ("
+            "location TEXT NOT NULL, time TEXT NOT NULL, "
+            + ", ".join(f"{f} REAL" for f in CURRENT_FIELDS)
+            + ", PRIMARY KEY (location, time)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def upsert_hourly(self, location: str, hourly: dict) -> int:
+        times = hourly.get("time", [])
+        rows = list(zip([location] * len(times), times, *(hourly[f] for f in HOURLY_FIELDS)))
+        updates = ", ".join(f"{f}=COALESCE(excluded.{f}, {f})" for f in HOURLY_FIELDS)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO hourly (location, time, {', '.join(HOURLY_FIELDS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(HOURLY_FIELDS))}) "
+                f"ON CONFLICT (location, time) DO UPDATE SET {updates}",
+                rows,
+            )
+        return len(rows)
+
+    def upsert_current(self, location: str, time: str, values: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO current (location, time, {', '.join(CURRENT_FIELDS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(CURRENT_FIELDS))})",
+                (location, time, *(values.get(f) for f in CURRENT_FIELDS)),
+            )
+
+    def upsert_environment(self, location: str, data: dict) -> int:
+        """Store the hourly series and current reading of an environment_full payload."""
+        current = data["current"]
+        self.upsert_current(location, current["timestamp"], {
+            **current["air_quality"],
+            "wind_speed": current["wind"]["speed"],
+            "wind_direction": current["wind"]["direction"],
+        })
+        return self.upsert_hourly(location, data["hourly"])
+
+    def _range_sql(self, start: str | None, end: str | None) -> tuple[str, list]:
+        sql, args = "location = ?", []
+        if start is not None:
+            sql += " AND time >= ?"
+            args.append(start)
+        if end is not None:
+            sql += " AND time <= ?"
+            args.append(end)
+        return sql, args
+
+    def iter_hourly(self, location: str, start: str | None = None, end: str | None = None,
+                    batch_size: int = 5000) -> Iterator[list[tuple]]:
+        """Yield (time, *HOURLY_FIELDS) rows in time order, batch_size rows at a time.
+        File-backed stores read on their own connection, so a long iteration does not
+        hold up ingestion writes.
+        """
+        where, args = self._range_sql(start, end)
+        sql = f"SELECT time, {', '.join(HOURLY_FIELDS)} FROM hourly WHERE {where} ORDER BY time"
+        if str(self.path) == ":memory:":
+            with self._lock:
+                rows = self._conn.execute(sql, [location, *args]).fetchall()
+            for i in range(0, len(rows), batch_size):
+                yield rows[i:i + batch_size]
+            return
+        # Streaming responses step this generator on whichever threadpool thread is free
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, [location, *args])
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            conn.close()
+
+    def query_hourly(self, location: str, start: str | None = None, end: str | None = None) -> dict:
+        """Columnar hourly series for a time range, shaped like environment_full()["hourly"]."""
+        columns = {"time": [], **{f: [] for f in HOURLY_FIELDS}}
+        names = ("time", *HOURLY_FIELDS)
+        for batch in self.iter_hourly(location, start, end):
+            for name, values in zip(names, zip(*batch)):
+                columns[name].extend(values)
+        return columns
+
+    def time_range(self, location: str) -> dict:
+        with self._lock:
+            first, last, count = self._conn.execute(
+                "SELECT MIN(time), MAX(time), COUNT(*) FROM hourly WHERE location = ?", (location,)
+            ).fetchone()
+        return {"start": first, "end": last, "hours": count}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
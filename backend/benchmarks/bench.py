@@ -0,0 +1,236 @@
+"""Offline micro-benchmarks for the dispersion, AQI/wind and export paths.
+
+Run from backend/:
+
+    python -m benchmarks.bench                      # writes benchmarks/results/<commit>.json
+    python -m benchmarks.bench -k export --quick    # subset, smaller sizes
+    python -m benchmarks.bench compare OLD.json NEW.json [--threshold 1.10]
+
+Results are plain JSON (one record per case, times in seconds per call) so two
+commits can be compared with the `compare` subcommand or any other tool.
+Nothing here touches the network: inputs are synthetic and the history store is in memory.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+os.environ.setdefault("NILUFER_STORE_PATH", ":memory:")
+
+import numpy as np
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+DISPERSION_RAYS = (9, 45, 181)
+DISPERSION_RANGES = ((5000, 500), (5000, 50), (20000, 100))
+SERIES_LENGTHS = (240, 10_000, 100_000)
+EXPORT_ROWS = (240, 10_000, 100_000)
+JSON_MESHES = ((45, 5000, 50), (181, 20000, 50))
+PUFF_PARTICLES_PER_HOUR = (2000, 20000)
+PUFF_HOURS = 72
+
+
+def _environment(rows: int, seed: int = 0) -> dict:
+    """environment_full-shaped payload with `rows` hourly records."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    pm25 = rng.gamma(2.0, 12.0, rows).round(1).tolist()
+    pm25[::97] = [None] * len(pm25[::97])
+    return {
+        "location": {"city": "Bursa", "district": "Nilüfer", "lat": 40.2133, "lon": 28.9771},
+        "current": {
+            "timestamp": start.isoformat(),
+            "air_quality": {"pm2_5": 18.4, "pm10": 30.1, "no2": 21.0, "so2": 4.2, "co": 310.0, "aqi": 64},
+            "wind": {"speed": 3.2, "direction": 225.0, "vector": {"vx": 2.263, "vy": 2.263}},
+        },
+        "hourly": {
+            "time": [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(rows)],
+            "pm2_5": pm25,
+            "pm10": rng.gamma(2.0, 20.0, rows).round(1).tolist(),
+            "wind_speed": rng.uniform(0, 12, rows).round(2).tolist(),
+            "wind_direction": rng.uniform(0, 360, rows).round(0).tolist(),
+        },
+    }
+
+
+def _cases(quick: bool):
+    """Yield (name, params, callable). Imports happen here so --help stays fast."""
+    from app import derived, export, main
+    from app.dispersion import dispersion_mesh, mesh_to_columns, mesh_to_points, simulate_dispersion, simulate_dispersion_fast
+
+    base = dict(base_pm25=18.0, base_pm10=30.0, base_no2=20.0, base_so2=4.0, base_co=300.0)
+    rays = DISPERSION_RAYS[:2] if quick else DISPERSION_RAYS
+    for num_rays in rays:
+        for max_distance_m, step_m in DISPERSION_RANGES:
+            params = {"num_rays": num_rays, "max_distance_m": max_distance_m, "step_m": step_m}
+            for name, fn in (("simulate_dispersion", simulate_dispersion), ("simulate_dispersion_fast", simulate_dispersion_fast)):
+                yield f"dispersion.{name}", params, (
+                    lambda fn=fn, p=params: fn(3.5, 225.0, **base, **p)
+                )
+
+    lengths = SERIES_LENGTHS[:2] if quick else SERIES_LENGTHS
+    rng = np.random.default_rng(1)
+    for n in lengths:
+        pm = rng.gamma(2.0, 12.0, n)
+        speed = rng.uniform(0, 12, n)
+        direction = rng.uniform(0, 360, n)
+        pm_list, speed_list, dir_list = pm.tolist(), speed.tolist(), direction.tolist()
+        params = {"n": n}
+        yield "aqi.pm25_to_aqi", params, lambda pm=pm_list: [derived.pm25_to_aqi(v) for v in pm]
+        yield "aqi.pm25_to_aqi_array", params, lambda pm=pm: derived.pm25_to_aqi_array(pm)
+        yield "wind.wind_vector", params, (
+            lambda s=speed_list, d=dir_list: [derived.wind_vector(a, b) for a, b in zip(s, d)]
+        )
+        yield "wind.wind_vector_arrays", params, lambda s=speed, d=direction: derived.wind_vector_arrays(s, d)
+
+    rows = EXPORT_ROWS[:2] if quick else EXPORT_ROWS
+    for n in rows:
+        data = _environment(n)
+        params = {"rows": n}
+        yield "export.comprehensive_frame", params, lambda d=data: export.comprehensive_frame(d)
+        yield "export.csv", params, lambda d=data: export.save_comprehensive_data_to_csv(d, "bench.csv")
+        yield "export.excel", params, lambda d=data: export.save_comprehensive_data_to_excel(d, "bench.xlsx")
+
+    from app.puff import puff_frames
+
+    hours = np.arange(PUFF_HOURS)
+    # Calm air keeps every puff on the grid, the worst case for the live-puff count
+    winds = {
+        "moving": (3.0 + 2.0 * np.sin(hours / 6.0), (200.0 + 90.0 * np.sin(hours / 11.0)) % 360),
+        "calm": (np.full(PUFF_HOURS, 0.2), np.full(PUFF_HOURS, 200.0)),
+    }
+    emission = np.tile([18.0, 30.0, 20.0, 4.0, 300.0], (PUFF_HOURS, 1))
+    for wind, (wind_speed, wind_dir) in winds.items():
+        for pph in PUFF_PARTICLES_PER_HOUR[:1] if quick else PUFF_PARTICLES_PER_HOUR:
+            params = {"hours": PUFF_HOURS, "particles_per_hour": pph, "grid": 128, "wind": wind}
+            yield "puff.puff_frames", params, (
+                lambda pph=pph, ws=wind_speed, wd=wind_dir: puff_frames(
+                    ws, wd, emission, main.NILUFER_BOUNDING_BOX, 128, 128, particles_per_hour=pph,
+                )
+            )
+
+    for num_rays, max_distance_m, step_m in JSON_MESHES[:1] if quick else JSON_MESHES:
+        mesh = dispersion_mesh(3.5, 225.0, **base, num_rays=num_rays, max_distance_m=max_distance_m, step_m=step_m)
+        params = {"num_rays": num_rays, "max_distance_m": max_distance_m, "step_m": step_m, "points": int(mesh["lat"].size)}
+        points = mesh_to_points(mesh, 3.5, 225.0)
+        columns = mesh_to_columns(mesh, 3.5, 225.0)
+        yield "json.points", params, lambda c=points: main._encode_json(c)
+        yield "json.columnar", params, lambda c=columns: main._encode_json(c)
+
+
+def _measure(fn, repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(fn)
+    loops, elapsed = timer.autorange()
+    if elapsed < min_time:
+        loops = max(loops, int(loops * min_time / max(elapsed, 1e-9)))
+    runs = [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "min_s": min(runs),
+        "median_s": statistics.median(runs),
+        "mean_s": statistics.fmean(runs),
+        "stdev_s": statistics.stdev(runs) if len(runs) > 1 else 0.0,
+    }
+
+
+def _git(*args) -> str | None:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata() -> dict:
+    import pandas
+    import openpyxl
+
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def run(args) -> int:
+    out = Path(args.out) if args.out else None
+    meta = _metadata()
+    results = []
+    # Exporters write into csv_data/ under the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name, params, fn in _cases(args.quick):
+                if args.k and not any(k in name for k in args.k):
+                    continue
+                record = {"name": name, "params": params, **_measure(fn, args.repeat, args.min_time)}
+                results.append(record)
+                label = ",".join(f"{k}={v}" for k, v in params.items())
+                print(f"{name:<34} {label:<48} {record['median_s'] * 1e3:>11.3f} ms", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+
+    if out is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        out = RESULTS_DIR / f"{meta['commit'] or 'unknown'}{'-dirty' if meta['dirty'] else ''}.json"
+    out.write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+    print(out)
+    return 0
+
+
+def _key(record: dict) -> tuple:
+    return record["name"], tuple(sorted(record["params"].items()))
+
+
+def compare(args) -> int:
+    """Print median ratios NEW/OLD per case; exit 1 if any case slowed down past the threshold."""
+    old = {_key(r): r for r in json.loads(Path(args.old).read_text())["results"]}
+    new = {_key(r): r for r in json.loads(Path(args.new).read_text())["results"]}
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key]["median_s"] / old[key]["median_s"]
+        flag = ""
+        if ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 / args.threshold:
+            flag = "  faster"
+        label = ",".join(f"{k}={v}" for k, v in key[1])
+        print(f"{key[0]:<34} {label:<48} {ratio:>7.2f}x{flag}")
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:<34} only in {'old' if key in old else 'new'}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command")
+    cmp = sub.add_parser("compare", help="compare two result files")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=1.10, help="median ratio counted as a regression")
+    parser.add_argument("-k", action="append", help="only run cases whose name contains this (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="drop the largest sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat, at least")
+    parser.add_argument("--out", help="result file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+    return compare(args) if args.command == "compare" else run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Local throughput check for run.py --prod at several worker counts.
+
+Run from backend/:
+
+    python -m benchmarks.loadcheck --workers 1 2 4 --duration 10
+
+For each worker count a server is started on 127.0.0.1 against an in-process stub
+of the Open-Meteo APIs (nothing leaves the machine), warmed up, and then loaded by
+client threads for `duration` seconds on two paths:
+
+- simulate: POST /simulate with a new wind direction per request, so every request
+  is a CPU-bound cache miss; this is the path that should scale with workers
+- environment: GET /environment/full, served from the shared upstream snapshot
+
+Prints a JSON report with requests/s per path and the speedup over the first count.
+The client threads need CPU too, so expect sub-linear numbers on small machines.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HOURS = 240
+
+
+def _fake_point(query: dict) -> dict:
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(days=7)
+    times = [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(HOURS)]
+    point = {}
+    if "current" in query:
+        point["current"] = {"time": times[168], **{k: round(random.uniform(1, 40), 2) for k in query["current"][0].split(",")}}
+    if "hourly" in query:
+        point["hourly"] = {"time": times, **{
+            k: [round(random.uniform(1, 40), 2) for _ in times] for k in query["hourly"][0].split(",")
+        }}
+    return point
+
+
+class _StubUpstream(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        query = parse_qs(urlparse(self.path).query)
+        lats = query.get("latitude", ["0"])[0].split(",")
+        body = [_fake_point(query) for _ in lats] if len(lats) > 1 else _fake_point(query)
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _request(conn: http.client.HTTPConnection, method: str, path: str, body: dict | None = None) -> int:
+    payload = None if body is None else json.dumps(body).encode()
+    headers = {} if body is None else {"Content-Type": "application/json"}
+    conn.request(method, path, body=payload, headers=headers)
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+
+def _wait_ready(port: int, timeout_s: float = 60) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            if _request(conn, "GET", "/health") == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+
+def _simulate_body(rng: random.Random) -> dict:
+    return {"wind_speed": 4.0, "wind_dir_deg": rng.uniform(0, 360), "num_rays": 91, "max_distance_m": 8000, "step_m": 50}
+
+
+def _load(port: int, path: str, threads: int, duration_s: float) -> dict:
+    counts = [0] * threads
+    errors = [0] * threads
+    stop_at = time.monotonic() + duration_s
+
+    def worker(i: int) -> None:
+        rng = random.Random(i)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while time.monotonic() < stop_at:
+            try:
+                if path == "simulate":
+                    status = _request(conn, "POST", "/simulate?format=columnar", _simulate_body(rng))
+                else:
+                    status = _request(conn, "GET", "/environment/full")
+            except (OSError, http.client.HTTPException):
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                status = 0
+            if status == 200:
+                counts[i] += 1
+            else:
+                errors[i] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.monotonic()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.monotonic() - started
+    return {"requests": sum(counts), "errors": sum(errors), "seconds": round(elapsed, 3), "rps": round(sum(counts) / elapsed, 2)}
+
+
+def _run_server(workers: int, port: int, stub_port: int, workdir: Path) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        OPEN_METEO_AIR_QUALITY_URL=f"http://127.0.0.1:{stub_port}/v1/air-quality",
+        OPEN_METEO_FORECAST_URL=f"http://127.0.0.1:{stub_port}/v1/forecast",
+        NILUFER_STORE_PATH=str(workdir / "timeseries.sqlite3"),
+        NILUFER_SHARED_CACHE_DIR=str(workdir / f"cache-{workers}"),
+    )
+    return subprocess.Popen(
+        [sys.executable, "run.py", "--prod", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads-per-worker", type=int, default=4, help="client threads per server worker")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per path and worker count")
+    parser.add_argument("--port", type=int, default=5104)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    stub = _start_stub()
+    report = {"cpu_count": os.cpu_count(), "duration_s": args.duration, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            before = _StubUpstream.requests
+            server = _run_server(workers, args.port, stub.server_address[1], Path(tmp))
+            try:
+                _wait_ready(args.port)
+                threads = workers * args.threads_per_worker
+                _load(args.port, "environment", threads, 1.0)  # warm snapshots and connections
+                run = {"workers": workers, "client_threads": threads}
+                for path in ("simulate", "environment"):
+                    run[path] = _load(args.port, path, threads, args.duration)
+                run["upstream_requests"] = _StubUpstream.requests - before
+                report["runs"].append(run)
+                print(f"workers={workers}: simulate {run['simulate']['rps']} req/s, "
+                      f"environment {run['environment']['rps']} req/s, "
+                      f"upstream requests {run['upstream_requests']}", file=sys.stderr)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    stub.shutdown()
+
+    base = report["runs"][0] if report["runs"] else None
+    for run in report["runs"]:
+        for path in ("simulate", "environment"):
+            run[path]["speedup"] = round(run[path]["rps"] / base[path]["rps"], 2) if base[path]["rps"] else None
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Cold-start report: import cost per module, time to first request and resident memory.
+
+Run from backend/:
+
+    python -m benchmarks.startup                 # writes benchmarks/results/startup-<commit>.json
+    python -m benchmarks.startup --top 30 --out startup.json
+
+Import timing comes from `python -X importtime -c "import app.main"` in a fresh
+interpreter; `lazy` lists heavy modules that must not be loaded at that point.
+Time to first request is measured from spawning a single uvicorn process until
+GET /health answers, and RSS is sampled after that and again after one CSV export
+(the point where pandas gets loaded). Upstream calls go to a local stub.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .bench import RESULTS_DIR, _metadata
+from .loadcheck import BACKEND_DIR, _request, _start_stub, _wait_ready
+
+# Must stay out of `import app.main`; only the routes that need them load them
+LAZY_MODULES = ("pandas", "openpyxl", "scipy")
+
+
+def _import_times(env: dict) -> tuple[float, list[dict], dict]:
+    probe = "import sys, app.main; print(' '.join(m for m in %r if m in sys.modules))" % (LAZY_MODULES,)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+        except ValueError:
+            continue  # header line
+    total = next((m["cumulative_ms"] for m in modules if m["module"] == "app.main"), None)
+    loaded = proc.stdout.split()
+    return total, modules, {name: name not in loaded for name in LAZY_MODULES}
+
+
+def _rss_kb(pid: int) -> int | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _first_request(env: dict, port: int) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(port)
+        result = {"time_to_first_request_s": round(time.perf_counter() - started, 3), "rss_kb_ready": _rss_kb(server.pid)}
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        export_started = time.perf_counter()
+        status = _request(conn, "GET", "/export/csv/download")
+        result["first_export_s"] = round(time.perf_counter() - export_started, 3)
+        result["first_export_status"] = status
+        result["rss_kb_after_export"] = _rss_kb(server.pid)
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20, help="modules to list, by cumulative import time")
+    parser.add_argument("--port", type=int, default=5105)
+    parser.add_argument("--out", help="result file (default benchmarks/results/startup-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    stub = _start_stub()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            OPEN_METEO_AIR_QUALITY_URL=f"http://127.0.0.1:{stub.server_address[1]}/v1/air-quality",
+            OPEN_METEO_FORECAST_URL=f"http://127.0.0.1:{stub.server_address[1]}/v1/forecast",
+            NILUFER_STORE_PATH=str(Path(tmp) / "timeseries.sqlite3"),
+        )
+        env.pop("NILUFER_SHARED_CACHE_DIR", None)
+        total_ms, modules, lazy = _import_times(env)
+        serve = _first_request(env, args.port)
+    stub.shutdown()
+
+    top = sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:args.top]
+    meta = _metadata()
+    report = {"meta": meta, "import_app_main_ms": total_ms, "lazy": lazy, **serve, "top_imports": top}
+    for name, ok in lazy.items():
+        if not ok:
+            print(f"warning: {name} is imported by app.main", file=sys.stderr)
+    print(f"import app.main {total_ms} ms, first request after {serve['time_to_first_request_s']} s, "
+          f"RSS {serve['rss_kb_ready']} kB ready / {serve['rss_kb_after_export']} kB after export", file=sys.stderr)
+
+    out = Path(args.out) if args.out else None
+    if out is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        out = RESULTS_DIR / f"startup-{meta['commit'] or 'unknown'}{'-dirty' if meta['dirty'] else ''}.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(out)
+    return 0 if all(lazy.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
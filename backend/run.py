@@ -1,10 +1,54 @@
+import argparse
+import os
+import shutil
+from pathlib import Path
+
 import uvicorn
 
+
+def _default_shared_cache_dir() -> str:
+    # tmpfs keeps the shared cache in memory; fall back to disk elsewhere
+    shm = Path("/dev/shm")
+    return str(shm / "nilufer-cache") if shm.is_dir() else str(Path("data") / "cache")
+
+
+def _fresh_metrics_dir() -> str:
+    # Workers write their Prometheus samples here for /metrics to sum; files left by an
+    # earlier run would be counted again, so start from an empty directory
+    shm = Path("/dev/shm")
+    default = shm / "nilufer-metrics" if shm.is_dir() else Path("data") / "metrics"
+    path = Path(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or default)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    return str(path)
+
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="89.252.184.134",
-        port=5004,
-        reload=True,
-        access_log=True
-    )
+    parser = argparse.ArgumentParser(description="Nilüfer air quality API")
+    parser.add_argument("--prod", action="store_true", help="multi-worker mode without reload")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("NILUFER_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.environ.get("NILUFER_HOST", "89.252.184.134"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("NILUFER_PORT", 5004)))
+    args = parser.parse_args()
+
+    if args.prod:
+        # Workers inherit the environment, so they all open the same shared cache
+        os.environ.setdefault("NILUFER_SHARED_CACHE_DIR", _default_shared_cache_dir())
+        if args.workers > 1:
+            # Must be set before the workers import prometheus_client
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = _fresh_metrics_dir()
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            access_log=False,
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            access_log=True
+        )
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# app.main opens its store and reads its settings at import time
+os.environ["NILUFER_STORE_PATH"] = str(Path(tempfile.mkdtemp()) / "timeseries.sqlite3")
+os.environ.pop("NILUFER_SHARED_CACHE_DIR", None)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+HOURS = 240
+
+
+def environment(hours: int = HOURS) -> dict:
+    """environment_full payload with a deterministic hourly window."""
+    times = [f"2025-12-{1 + i // 24:02d}T{i % 24:02d}:00" for i in range(hours)]
+    return {
+        "location": {"city": "Bursa", "district": "Nilüfer", "lat": 40.2133, "lon": 28.9771},
+        "current": {
+            "timestamp": times[-1],
+            "air_quality": {"pm2_5": 20.0, "pm10": 30.0, "no2": 10.0, "so2": 4.0, "co": 0.5, "aqi": 68},
+            "wind": {"speed": 3.0, "direction": 90, "vector": {"vx": -3.0, "vy": 0.0}},
+        },
+        "hourly": {
+            "time": times,
+            "pm2_5": [10.0 + i % 30 for i in range(hours)],
+            "pm10": [20.0] * hours,
+            "wind_speed": [2.0 + i % 5 for i in range(hours)],
+            "wind_direction": [float(15 * i % 360) for i in range(hours)],
+        },
+    }
+
+
+@pytest.fixture
+def main(monkeypatch):
+    """app.main with the upstream environment fetch replaced by environment()."""
+    from app import main
+
+    async def fetch(refresh: bool = False):
+        return environment()
+
+    monkeypatch.setattr(main, "_fetch_environment_full", fetch)
+    return main
@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+
+from app.cache import TTLCache
+
+
+def test_bounding_box_batches_and_concurrency(main, monkeypatch):
+    requests = {main.AIR_QUALITY_URL: [], main.FORECAST_URL: []}
+    in_flight = peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            in_flight -= 1
+        url = str(request.url.copy_with(query=None))
+        lats = request.url.params["latitude"].split(",")
+        requests[url].append(len(lats))
+        if url == main.AIR_QUALITY_URL:
+            current = {"pm2_5": 12.0, "pm10": 20.0, "nitrogen_dioxide": 8.0, "sulphur_dioxide": 2.0, "carbon_monoxide": 200.0}
+        else:
+            current = {"wind_speed_10m": 3.0, "wind_direction_10m": 180}
+        return httpx.Response(200, json=[{"current": current} for _ in lats])
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(main, "_get_client", lambda: client)
+        monkeypatch.setattr(main, "_upstream_slots", asyncio.Semaphore(main.UPSTREAM_CONCURRENCY))
+        monkeypatch.setattr(main, "_cell_cache", TTLCache(4096, max_age_s=main.CURRENT_TTL_S))
+        async with client:
+            first = await main.environment_bounding_box(rows=20, cols=20)
+            second = await main.environment_bounding_box(rows=20, cols=20)
+        return first, second
+
+    first, second = asyncio.run(run())
+    cells = 20 * 20
+    batches = -(-cells // main.BBOX_BATCH_SIZE)
+    for sizes in requests.values():
+        # One request per batch and API; the second call is served from the cell cache
+        assert len(sizes) == batches
+        assert sum(sizes) == cells
+        assert max(sizes) <= main.BBOX_BATCH_SIZE
+    assert peak == main.UPSTREAM_CONCURRENCY
+    assert first == second
+    assert first["total_points"] == cells
+    assert first["points"][0]["air_quality"]["pm2_5"] == 12.0
+    assert first["points"][0]["wind"]["direction"] == 180
@@ -0,0 +1,104 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.dispersion import (
+    POLLUTANTS,
+    KernelTable,
+    SourceArrays,
+    grid_axes,
+    plume_weight,
+    simulate_dispersion,
+    simulate_dispersion_fast,
+    superpose_grid,
+    superpose_points,
+)
+
+BASE = (35.0, 50.0, 20.0, 4.0, 300.0)
+BBOX = {"lat_min": 40.15, "lat_max": 40.30, "lon_min": 28.85, "lon_max": 29.05}
+
+
+def _assert_same_points(fast: dict, reference: dict):
+    assert fast["meta"] == reference["meta"]
+    assert len(fast["points"]) == len(reference["points"])
+    for got, want in zip(fast["points"], reference["points"]):
+        assert got["lat"] == pytest.approx(want["lat"], abs=1e-12)
+        assert got["lng"] == pytest.approx(want["lng"], abs=1e-12)
+        for name in POLLUTANTS:
+            # Both sides round; float noise may only move a value across a rounding boundary
+            assert got[name] == pytest.approx(want[name], abs=1.01e-3 if name == "co" else 1.01e-2)
+        assert (got["distance_m"], got["cloudRadius"], got["color"]) == (
+            want["distance_m"], want["cloudRadius"], want["color"],
+        )
+
+
+@pytest.mark.parametrize("wind_speed, wind_dir, num_rays, max_distance_m, step_m", [
+    (0.0, 225.0, 9, 5000, 500),  # calm: widest spread
+    (4.0, 0.0, 9, 5000, 500),  # rays either side of north straddle 0/360
+    (4.0, 360.0, 9, 5000, 500),
+    (12.0, 355.0, 181, 20_000, 250),  # most rays the API allows
+])
+def test_fast_matches_reference(wind_speed, wind_dir, num_rays, max_distance_m, step_m):
+    args = (wind_speed, wind_dir, *BASE)
+    kwargs = {"num_rays": num_rays, "max_distance_m": max_distance_m, "step_m": step_m}
+    _assert_same_points(simulate_dispersion_fast(*args, **kwargs), simulate_dispersion(*args, **kwargs))
+
+
+def _sources(n: int, seed: int = 0) -> SourceArrays:
+    rng = np.random.default_rng(seed)
+    # Some sources sit outside the bbox so their sectors are only partly on the grid
+    lat = rng.uniform(BBOX["lat_min"] - 0.05, BBOX["lat_max"] + 0.05, n)
+    lng = rng.uniform(BBOX["lon_min"] - 0.05, BBOX["lon_max"] + 0.05, n)
+    return SourceArrays(lat, lng, rng.uniform(1.0, 50.0, (n, len(POLLUTANTS))))
+
+
+def _brute_force(sources: SourceArrays, lat, lng, wind_speed, wind_dir, max_distance_m) -> np.ndarray:
+    total = np.zeros((len(POLLUTANTS),) + np.broadcast(lat, lng).shape)
+    for i in range(sources.lat.size):
+        weight = plume_weight(
+            wind_speed, wind_dir, lat, lng, max_distance_m, src_lat=sources.lat[i], src_lng=sources.lng[i],
+        )
+        total += sources.base[i].reshape((-1,) + (1,) * weight.ndim) * weight
+    return total
+
+
+@pytest.mark.parametrize("wind_speed, wind_dir", [(0.0, 90.0), (5.0, 358.0), (10.0, 181.0)])
+def test_superpose_points_matches_brute_force(wind_speed, wind_dir):
+    sources = _sources(40)
+    rng = np.random.default_rng(1)
+    lat = rng.uniform(BBOX["lat_min"], BBOX["lat_max"], 5000)
+    lng = rng.uniform(BBOX["lon_min"], BBOX["lon_max"], 5000)
+    got = superpose_points(sources, lat, lng, wind_speed, wind_dir, 5000)
+    np.testing.assert_array_equal(got, _brute_force(sources, lat, lng, wind_speed, wind_dir, 5000))
+
+
+@pytest.mark.parametrize("wind_speed, wind_dir", [(0.0, 90.0), (5.0, 358.0), (10.0, 181.0)])
+def test_superpose_grid_matches_brute_force(wind_speed, wind_dir):
+    sources = _sources(40)
+    got = superpose_grid(BBOX, 120, 90, wind_speed, wind_dir, sources, 5000)
+    lats, lngs = grid_axes(BBOX, 120, 90)
+    want = _brute_force(sources, lats[:, None], lngs[None, :], wind_speed, wind_dir, 5000)
+    for k, name in enumerate(POLLUTANTS):
+        np.testing.assert_allclose(got[name], want[k], rtol=1e-5, atol=1e-5 * want[k].max())
+
+
+def test_kernel_table_is_thread_safe():
+    # Room for a handful of kernels, so most lookups evict while other threads read
+    table = KernelTable(max_bytes=8 * 4 * 9 * 10 * 8)
+    rng = np.random.default_rng(2)
+    winds = list(zip(rng.uniform(0, 10, 2000), rng.uniform(0, 360, 2000)))
+    base = dict.fromkeys(POLLUTANTS, 1.0)
+    interval = sys.getswitchinterval()
+    # Switch threads as often as possible so unguarded OrderedDict updates interleave
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            meshes = list(pool.map(lambda w: table.mesh(*w, base), winds))
+    finally:
+        sys.setswitchinterval(interval)
+    assert all(m["pm25"].size == 90 for m in meshes)
+    snapshot = table.snapshot()
+    assert snapshot["hits"] + snapshot["misses"] == len(winds)
+    assert snapshot["size_bytes"] == sum(table._nbytes(k) for k in table._kernels.values()) <= table.max_bytes
@@ -0,0 +1,20 @@
+from app.push import diff
+
+from .conftest import environment
+
+
+def test_missing_pollutants_are_not_fabricated(main):
+    data = environment()
+    before = main._push_state(data)
+    assert before["plume"]["columns"]["so2"][0] > 0
+
+    data = environment()
+    data["current"]["air_quality"]["so2"] = None
+    after = main._push_state(data)
+    assert after["plume"]["columns"]["so2"] is None
+    assert after["plume"]["columns"]["pm25"] == before["plume"]["columns"]["pm25"]
+
+    # Live clients see the pollutant go null instead of a default plume
+    changed = diff(before, after)
+    assert changed["current"]["air_quality"] == {"so2": None}
+    assert changed["plume"]["columns"] == {"so2": None}
@@ -0,0 +1,20 @@
+import asyncio
+
+import httpx
+
+from .conftest import HOURS
+
+
+def test_concurrent_hourly_downloads(main):
+    async def run():
+        await main.environment_full()  # ingest once before the downloads race
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get("/export/csv/hourly/download") for _ in range(50)))
+
+    responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200] * 50
+    for r in responses:
+        lines = r.text.lstrip("\ufeff").splitlines()
+        assert lines[0].startswith("time,pm2_5")
+        assert len(lines) == HOURS + 1
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from .conftest import HOURS
+
+
+def _decode(body: bytes) -> tuple[dict, np.ndarray]:
+    assert body[:4] == b"NDAF"
+    length = int.from_bytes(body[4:8], "little")
+    header = json.loads(body[8:8 + length])
+    planes = np.frombuffer(body[8 + length:], dtype=header["dtype"])
+    return header, planes.reshape(len(header["fields"]), len(header["times"]), header["height"], header["width"])
+
+
+def test_frames_roundtrip(main):
+    client = TestClient(main.app)
+    r = client.post("/simulate/frames", json={"width": 32, "height": 24, "fields": ["pm25", "no2"], "encoding": "absolute"})
+    assert r.status_code == 200
+    assert r.headers["vary"].startswith("Accept-Encoding")
+    header, planes = _decode(r.content)
+    assert planes.shape == (2, HOURS, 24, 32)
+    assert planes.max() == np.iinfo(header["dtype"]).max
+    assert header["scale"]["pm25"] > 0
+
+
+def test_frames_size_is_bounded(main):
+    client = TestClient(main.app)
+    body = {"width": 512, "height": 512, "fields": ["pm25", "pm10", "no2", "so2", "co"]}
+    assert client.post("/simulate/frames", json=body).status_code == 422
+    assert client.post("/simulate/frames", json={"max_distance_m": 10**6}).status_code == 422
+
+
+def test_puff_cap_keeps_mass():
+    from app.puff import puff_frames
+
+    hours = 24
+    calm = (np.full(hours, 0.2), np.full(hours, 200.0))
+    emission = np.full((hours, 1), 10.0)
+    bbox = {"lat_min": 40.15, "lat_max": 40.28, "lon_min": 28.88, "lon_max": 29.05}
+    full = puff_frames(*calm, emission, bbox, 32, 32, particles_per_hour=1200)
+    capped = puff_frames(*calm, emission, bbox, 32, 32, particles_per_hour=1200, max_puffs=2000)
+    assert abs(capped[-1].sum() / full[-1].sum() - 1) < 0.02
@@ -0,0 +1,38 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.interpolation import IndexCache
+
+
+def test_partial_fields_and_tree_reuse(main):
+    client = TestClient(main.app)
+    points = [
+        {"lat": 40.20, "lon": 28.95, "pm2_5": 10.0, "no2": 30.0},
+        {"lat": 40.21, "lon": 28.95, "pm2_5": 20.0},
+        {"lat": 40.20, "lon": 28.96, "pm2_5": 30.0},
+    ]
+    body = {"lat": [40.21], "lon": [28.95], "points": points}
+    r = client.post("/interpolate", json=body)
+    assert r.status_code == 200
+    data = r.json()
+    # The PM2.5-only station is used for PM2.5 rather than dropped
+    assert data["source_points"] == 3
+    assert data["pm2_5"] == [20.0]
+    assert data["no2"] == [30.0]
+    assert data["co"] == [None]
+
+    builds = main._index_cache.stats["builds"]
+    points[0]["pm2_5"] = 50.0
+    kriged = client.post("/interpolate", json={**body, "method": "kriging"}).json()
+    assert main._index_cache.stats["builds"] == builds
+    assert abs(kriged["pm2_5"][0] - 20.0) < 0.5
+
+
+def test_masked_neighbours_are_skipped():
+    lat = np.array([0.0, 0.0, 0.0, 0.0])
+    lng = np.array([0.0, 0.001, 0.002, 0.003])
+    index = IndexCache().get(lat, lng)
+    values = {"a": np.array([1.0, np.nan, np.nan, 4.0]), "b": np.array([1.0, 2.0, 3.0, 4.0])}
+    est = index.idw(np.array([0.0]), np.array([0.0011]), values, k=1)
+    assert est["a"][0] == 1.0
+    assert est["b"][0] == 2.0
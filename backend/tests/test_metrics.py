@@ -0,0 +1,43 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from prometheus_client import REGISTRY
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+WORKER = "from app.metrics import SPAN_SECONDS; SPAN_SECONDS.labels('test').observe(0.5)"
+SCRAPE = (
+    "from prometheus_client import generate_latest; from app.metrics import scrape_registry; "
+    "print(generate_latest(scrape_registry()).decode())"
+)
+
+
+def test_metrics_are_summed_across_workers(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", WORKER], cwd=BACKEND, env=env, check=True)
+    scrape = subprocess.run(
+        [sys.executable, "-c", SCRAPE], cwd=BACKEND, env=env, check=True, capture_output=True, text=True,
+    )
+    assert 'span_duration_seconds_count{span="test"} 2.0' in scrape.stdout
+
+
+def test_spans_are_logged_and_timed(main):
+    from app.metrics import span
+
+    handler = logging.getLogger("app.spans").handlers[0]
+    stream = io.StringIO()
+    previous = handler.setStream(stream)
+    try:
+        with span("test.logged") as record:
+            record["rows"] = 3
+    finally:
+        handler.setStream(previous)
+    line = json.loads(stream.getvalue())
+    assert (line["span"], line["rows"]) == ("test.logged", 3)
+    assert REGISTRY.get_sample_value("span_duration_seconds_count", {"span": "test.logged"}) == 1
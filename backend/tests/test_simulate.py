@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+
+
+def _sources(n: int) -> list[dict]:
+    return [{"lat": 40.2 + 0.001 * i, "lng": 28.95, "base_pm25": 10.0} for i in range(n)]
+
+
+def test_multi_source_work_is_bounded(main):
+    client = TestClient(main.app)
+    assert client.post("/simulate", json={"sources": _sources(3)}).status_code == 200
+    coarse = {"num_rays": 181, "max_distance_m": 20_000, "step_m": 50}
+    r = client.post("/simulate", json={"sources": _sources(20), **coarse})
+    assert r.status_code == 422
+    assert "mesh points" in r.json()["detail"]
+
+
+def test_etag_depends_on_negotiated_format(main):
+    client = TestClient(main.app)
+    points = client.get("/simulate")
+    binary = client.get("/simulate", headers={"Accept": "application/octet-stream"})
+    assert binary.headers["content-type"] == "application/octet-stream"
+    assert points.headers["etag"] != binary.headers["etag"]
+    for r in (points, binary):
+        assert "Accept" in r.headers["vary"].split(", ")
+
+    # A cached points ETag must not validate a binary request
+    r = client.get("/simulate", headers={"Accept": "application/octet-stream", "If-None-Match": points.headers["etag"]})
+    assert r.status_code == 200
+    r = client.get("/simulate", headers={"Accept": "application/octet-stream", "If-None-Match": binary.headers["etag"]})
+    assert r.status_code == 304
+    assert "Accept" in r.headers["vary"].split(", ")
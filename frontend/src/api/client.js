@@ -55,3 +55,100 @@ export async function environmentBoundingBox() {
     throw error
   }
 }
+
+// Field order of the binary /simulate payload (backend/app/dispersion.py MESH_FIELDS)
+const MESH_FIELDS = ['lat', 'lng', 'pm25', 'pm10', 'no2', 'so2', 'co', 'distance_m', 'color_index']
+const MESH_HEADER_BYTES = 28
+
+export async function simulateColumnar(params) {
+  const { data } = await api.post('/simulate', params, { params: { format: 'columnar' } })
+  return data
+}
+
+export async function simulateBinary(params) {
+  const { data } = await api.post('/simulate', params, {
+    params: { format: 'binary' },
+    responseType: 'arraybuffer',
+  })
+  const view = new DataView(data)
+  const magic = String.fromCharCode(...new Uint8Array(data, 0, 4))
+  if (magic !== 'NDSP') throw new Error('Unexpected simulate payload')
+  const fieldCount = view.getUint16(6, true)
+  const count = view.getUint32(8, true)
+  const meta = {
+    source: { lat: view.getFloat32(12, true), lng: view.getFloat32(16, true) },
+    wind_speed: view.getFloat32(20, true),
+    wind_dir_deg: view.getFloat32(24, true),
+  }
+  const columns = {}
+  for (let i = 0; i < fieldCount; i++) {
+    columns[MESH_FIELDS[i]] = new Float32Array(data, MESH_HEADER_BYTES + i * count * 4, count)
+  }
+  return { meta, count, columns }
+}
+
+// Animation frames from /simulate/frames: JSON header + quantized rasters (field, frame, row, col)
+export async function simulateFrames(params = {}) {
+  const { data } = await api.post('/simulate/frames', params, { responseType: 'arraybuffer' })
+  const view = new DataView(data)
+  const headerLength = view.getUint32(4, true)
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(data, 8, headerLength)))
+  const ArrayType = header.dtype === 'uint16' ? Uint16Array : Uint8Array
+  const frameSize = header.width * header.height
+  const frameCount = header.times.length
+  let offset = 8 + headerLength
+  const fields = {}
+  for (const name of header.fields) {
+    const q = new ArrayType(data.slice(offset, offset + frameCount * frameSize * ArrayType.BYTES_PER_ELEMENT))
+    offset += q.byteLength
+    if (header.encoding === 'delta') {
+      // Running sum in the same integer type undoes the modular deltas
+      for (let i = frameSize; i < q.length; i++) q[i] = q[i] + q[i - frameSize]
+    }
+    const scale = header.scale[name]
+    fields[name] = Array.from({ length: frameCount }, (_, t) => {
+      const out = new Float32Array(frameSize)
+      for (let i = 0; i < frameSize; i++) out[i] = q[t * frameSize + i] * scale
+      return out
+    })
+  }
+  return { ...header, fields }
+}
+
+function mergeChanges(target, changes) {
+  const out = { ...target }
+  for (const [key, value] of Object.entries(changes)) {
+    if (value !== null && typeof value === 'object' && !Array.isArray(value) && typeof out[key] === 'object' && out[key] !== null) {
+      out[key] = mergeChanges(out[key], value)
+    } else out[key] = value
+  }
+  return out
+}
+
+function removePath(target, path) {
+  const [key, ...rest] = path
+  if (typeof target !== 'object' || target === null || !(key in target)) return target
+  const out = { ...target }
+  if (rest.length) out[key] = removePath(out[key], rest)
+  else delete out[key]
+  return out
+}
+
+function applyUpdate(target, { changed, removed }) {
+  return removed.reduce(removePath, mergeChanges(target, changed))
+}
+
+// Live environment + plume over server-sent events; returns an unsubscribe function
+export function subscribeEnvironment(onState) {
+  const source = new EventSource(`${API_BASE}/events`)
+  let state = null
+  source.addEventListener('snapshot', (e) => {
+    state = JSON.parse(e.data)
+    onState(state)
+  })
+  source.addEventListener('update', (e) => {
+    state = applyUpdate(state || {}, JSON.parse(e.data))
+    onState(state)
+  })
+  return () => source.close()
+}
@@ -3,7 +3,7 @@ import AlertBanner from '../components/AlertBanner.jsx'
 import InfoBox from '../components/InfoBox.jsx'
 import PollutionCard from '../components/PollutionCard.jsx'
 import MapView from '../components/MapView.jsx'
-import { environmentFull, environmentBoundingBox, testApi } from '../api/client.js'
+import { environmentFull, environmentBoundingBox, testApi, subscribeEnvironment } from '../api/client.js'
 import TimeControls from '../components/TimeControls.jsx'
 import { getRadarTimeline, frameToTileUrl, getRadarTimelineDetailed } from '../api/radar.js'
 
@@ -318,6 +318,9 @@ export default function Dashboard() {
 
   useEffect(() => { load() }, [])
 
+  // Backend pushes each new snapshot; no polling needed
+  useEffect(() => subscribeEnvironment(state => setEnv(prev => ({ ...prev, ...state }))), [])
+
   // load radar frames once
   useEffect(() => {
     (async () => {